@@ -27,6 +27,7 @@ class Settings(BaseSettings):
     LOG_LEVEL: str = "INFO"
     LOG_FILE_PATH: str = "logs/app.log"
     LOG_FORMAT: str = "json"
+    LOG_ENQUEUE: bool = False
 
     def get_log_file_path(self) -> str:
         """Get environment-specific log file path"""
@@ -41,6 +42,9 @@ class Settings(BaseSettings):
     RELOAD: bool = False
     WORKERS: int = 1
 
+    # Profiling settings (development only, requires pyinstrument)
+    PROFILING: bool = False
+
     @field_validator("BACKEND_CORS_ORIGINS", mode="before")
     @classmethod
     def assemble_cors_origins(cls, v):
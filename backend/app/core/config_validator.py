@@ -123,6 +123,10 @@ class ConfigValidator:
                 self.errors.append("RELOAD must be False in production")
                 valid = False
 
+            if self.settings.PROFILING:
+                self.errors.append("PROFILING must be False in production")
+                valid = False
+
             if self.settings.LOG_LEVEL == "DEBUG":
                 self.warnings.append("DEBUG log level not recommended in production")
 
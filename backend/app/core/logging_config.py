@@ -12,6 +12,22 @@ from app.core.config import settings
 from app.core.logging_models import format_log_record
 
 
+def _write_json_line(message: Any) -> None:
+    """
+    Loguru sink that writes each record to stdout as one JSON line.
+
+    A sink rather than a format function: loguru parses whatever a format
+    function returns as a template, which the braces of the JSON would break.
+    Each line is flushed so it isn't held in stdout's buffer when stdout is
+    not a tty (containers, pipes) and lost if the process dies.
+
+    Args:
+        message: Loguru message carrying the record
+    """
+    sys.stdout.write(format_log_record(message.record) + "\n")
+    sys.stdout.flush()
+
+
 def setup_logging() -> None:
     """
     Setup structured logging with Loguru.
@@ -20,10 +36,15 @@ def setup_logging() -> None:
     - Console output with appropriate formatting
     - File output with JSON formatting and rotation
     - Log levels based on environment
+    - Optional background queue (LOG_ENQUEUE) so requests never wait on sink I/O
     """
     # Remove default handler
     logger.remove()
 
+    # With enqueue, records are handed to a queue and formatted/written by a
+    # background worker instead of the calling request
+    enqueue = settings.LOG_ENQUEUE
+
     # Ensure logs directory exists
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
@@ -41,6 +62,7 @@ def setup_logging() -> None:
             sys.stdout,
             format=console_format,
             level=settings.LOG_LEVEL,
+            enqueue=enqueue,
             colorize=True,
             backtrace=True,
             diagnose=True,
@@ -48,9 +70,9 @@ def setup_logging() -> None:
     else:
         # Production/Testing: JSON format
         logger.add(
-            sys.stdout,
-            format=lambda record: format_log_record(record),
+            _write_json_line,
             level=settings.LOG_LEVEL,
+            enqueue=enqueue,
             serialize=False,  # We handle JSON formatting ourselves
         )
 
@@ -61,6 +83,7 @@ def setup_logging() -> None:
     logger.add(
         str(log_file_path),
         level=settings.LOG_LEVEL,
+        enqueue=enqueue,
         rotation="10 MB",  # Rotate when file reaches 10MB
         retention="30 days",  # Keep logs for 30 days
         compression="gz",  # Compress rotated files
@@ -74,6 +97,7 @@ def setup_logging() -> None:
     logger.add(
         str(error_log_path),
         level="ERROR",
+        enqueue=enqueue,
         rotation="10 MB",
         retention="90 days",  # Keep error logs longer
         compression="gz",
@@ -88,6 +112,7 @@ def setup_logging() -> None:
         logger.add(
             sys.stderr,
             level="ERROR",
+            enqueue=enqueue,
             serialize=True,
         )
 
@@ -98,6 +123,7 @@ def setup_logging() -> None:
             "log_level": settings.LOG_LEVEL,
             "log_file": str(log_file_path),
             "log_format": settings.LOG_FORMAT,
+            "log_enqueue": enqueue,
         },
     )
 
@@ -177,6 +203,7 @@ def log_response(
     status_code: int,
     duration_ms: float,
     response_size: int = None,
+    request_context: dict[str, Any] | None = None,
 ) -> None:
     """
     Log response information.
@@ -186,6 +213,8 @@ def log_response(
         status_code: HTTP status code
         duration_ms: Request duration in milliseconds
         response_size: Response size in bytes
+        request_context: Request fields (see create_request_context) to merge into
+            the record, so one line describes the whole request
     """
     from app.core.logging_models import create_response_context
 
@@ -196,6 +225,14 @@ def log_response(
         response_size=response_size,
     )
 
+    if request_context:
+        context = {**request_context, **context}
+        message = (
+            f"Request completed: {request_context['method']} {request_context['path']} {status_code} ({duration_ms:.2f}ms)"
+        )
+    else:
+        message = f"Request completed: {status_code} ({duration_ms:.2f}ms)"
+
     # Choose log level based on status code
     if status_code >= 500:
         level = "ERROR"
@@ -204,7 +241,7 @@ def log_response(
     else:
         level = "INFO"
 
-    logger.log(level, f"Request completed: {status_code} ({duration_ms:.2f}ms)", extra=context)
+    logger.log(level, message, extra=context)
 
 
 def log_error(
@@ -2,11 +2,17 @@
 Logging data models and formatters for structured logging.
 """
 
+import json
 from datetime import UTC, datetime
 from typing import Any
 
 from pydantic import BaseModel, Field
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    orjson = None  # type: ignore[assignment]
+
 
 class LogEntry(BaseModel):
     """Structured log entry model"""
@@ -22,9 +28,6 @@ class LogEntry(BaseModel):
     duration_ms: float | None = None
     extra: dict[str, Any] | None = None
 
-    class Config:
-        json_encoders = {datetime: lambda v: v.isoformat()}
-
 
 class RequestLogEntry(LogEntry):
     """Request-specific log entry model"""
@@ -54,6 +57,39 @@ class ErrorLogEntry(LogEntry):
     context: dict[str, Any] | None = None
 
 
+def _json_default(value: Any) -> str:
+    """
+    Serialize values the JSON encoder does not handle natively.
+
+    Args:
+        value: Value that is not JSON serializable
+
+    Returns:
+        ISO 8601 string for datetimes, str() for anything else
+    """
+    if isinstance(value, datetime):
+        # Naive datetimes are UTC, matching orjson's OPT_NAIVE_UTC
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=UTC)
+        return value.isoformat()
+    return str(value)
+
+
+def _dumps(data: dict[str, Any]) -> str:
+    """
+    Encode a log record as compact JSON, using orjson when it is installed.
+
+    Args:
+        data: Log data to encode
+
+    Returns:
+        JSON formatted string
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_json_default, option=orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+
 def format_log_record(record: dict) -> str:
     """
     Format log record as JSON string for structured logging.
@@ -64,11 +100,9 @@ def format_log_record(record: dict) -> str:
     Returns:
         JSON formatted string
     """
-    import json
-
-    # Extract basic information
+    # Extract basic information; the encoder serializes the datetime itself
     log_data = {
-        "timestamp": record["time"].isoformat(),
+        "timestamp": record["time"],
         "level": record["level"].name,
         "message": record["message"],
         "module": record["name"],
@@ -93,7 +127,7 @@ def format_log_record(record: dict) -> str:
             "traceback": record["exception"]["traceback"] if record["exception"]["traceback"] else None,
         }
 
-    return json.dumps(log_data, ensure_ascii=False, separators=(",", ":"))
+    return _dumps(log_data)
 
 
 def create_request_context(
@@ -120,23 +154,20 @@ def create_request_context(
     Returns:
         Dictionary with request context
     """
-    context = {
+    # Empty optional values (None, "", {}) are dropped so they are not serialized on every request
+    optional = (
+        ("user_id", user_id),
+        ("client_ip", client_ip),
+        ("user_agent", user_agent),
+        ("query_params", query_params),
+    )
+    return {
         "request_id": request_id,
         "method": method,
         "path": path,
+        **{key: value for key, value in optional if value},
     }
 
-    if user_id:
-        context["user_id"] = user_id
-    if client_ip:
-        context["client_ip"] = client_ip
-    if user_agent:
-        context["user_agent"] = user_agent
-    if query_params:
-        context["query_params"] = query_params
-
-    return context
-
 
 def create_response_context(
     request_id: str,
@@ -156,17 +187,13 @@ def create_response_context(
     Returns:
         Dictionary with response context
     """
-    context = {
+    return {
         "request_id": request_id,
         "status_code": status_code,
         "duration_ms": duration_ms,
+        **({"response_size": response_size} if response_size is not None else {}),
     }
 
-    if response_size is not None:
-        context["response_size"] = response_size
-
-    return context
-
 
 def create_error_context(
     request_id: str,
@@ -192,11 +219,6 @@ def create_error_context(
         "request_id": request_id,
         "error_type": error_type,
         "error_message": error_message,
+        **({"stack_trace": stack_trace} if stack_trace else {}),
     }
-
-    if stack_trace:
-        context["stack_trace"] = stack_trace
-    if additional_context:
-        context.update(additional_context)
-
-    return context
+    return {**context, **additional_context} if additional_context else context
@@ -5,5 +5,6 @@ Middleware package for the FastAPI application.
 from .error_handler import ErrorHandlerMiddleware
 from .jwt_parser import JWTParserMiddleware
 from .logging_middleware import LoggingMiddleware
+from .profiling import ProfilingMiddleware
 
-__all__ = ["ErrorHandlerMiddleware", "JWTParserMiddleware", "LoggingMiddleware"]
+__all__ = ["ErrorHandlerMiddleware", "JWTParserMiddleware", "LoggingMiddleware", "ProfilingMiddleware"]
@@ -11,30 +11,53 @@ from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from loguru import logger
 from pydantic import ValidationError
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.core.exceptions import BaseAppException
 from app.schemas.error import ErrorResponse, ValidationErrorDetail, ValidationErrorResponse
 
 
-class ErrorHandlerMiddleware(BaseHTTPMiddleware):
-    """Global error handling middleware."""
+class ErrorHandlerMiddleware:
+    """Global error handling middleware (pure ASGI)."""
 
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """Process request and handle any exceptions."""
-        # Generate request ID for tracking
-        request_id = str(uuid.uuid4())
-        request.state.request_id = request_id
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Generate the request ID once here, the outermost middleware, unless a
+        # wrapping app already assigned one; inner middleware reuses it
+        state = scope.setdefault("state", {})
+        request_id = state.get("request_id")
+        if request_id is None:
+            request_id = state["request_id"] = str(uuid.uuid4())
+
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
 
         try:
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send_wrapper)
 
         except (HTTPException, RequestValidationError, ValidationError, BaseAppException):
             # Let these be handled by exception handlers
             raise
         except Exception as exc:
-            return await self._handle_exception(request, exc, request_id)
+            # Too late to replace a response that is already on the wire
+            if response_started:
+                raise
+            response = await self._handle_exception(Request(scope, receive), exc, request_id)
+            # Inner middleware never sees this response, so tag it with the request ID here
+            response.headers["X-Request-ID"] = request_id
+            await response(scope, receive, send)
 
     async def _handle_exception(self, request: Request, exc: Exception, request_id: str) -> JSONResponse:
         """Handle different types of exceptions and return appropriate responses."""
@@ -5,21 +5,92 @@ This middleware parses JWT tokens and extracts user information without validati
 the token signature, as validation is handled by Kong API Gateway.
 """
 
+import hashlib
+import time
+from collections import OrderedDict
 from typing import Any
 
 from fastapi import Request
 from jose import JWTError, jwt
 from loguru import logger
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from app.schemas.user import JWTParseResult, UserContext
+from app.schemas.user import ANONYMOUS_CONTEXT, JWTParseResult, UserContext
 
+# Parsed tokens are remembered for at most this many seconds
+_TOKEN_CACHE_TTL = 60
+_TOKEN_CACHE_MAXSIZE = 4096
 
-class JWTParserMiddleware(BaseHTTPMiddleware):
+
+class _TokenCache:
+    """
+    Small TTL-LRU cache mapping token digests to parsed user contexts.
+
+    Keys are blake2b digests, so raw tokens are never kept in memory. Entries
+    expire after the TTL or at the token's own ``exp``, whichever comes first,
+    and are purged lazily when looked up.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[bytes, tuple[UserContext, float]] = OrderedDict()
+
+    @staticmethod
+    def key(token: bytes) -> bytes:
+        """Return the cache key for a raw token."""
+        return hashlib.blake2b(token, digest_size=16).digest()
+
+    def get(self, key: bytes) -> UserContext | None:
+        """Return the cached context for a key, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        user_context, deadline = entry
+        if time.time() >= deadline:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return user_context
+
+    def set(self, key: bytes, user_context: UserContext) -> None:
+        """Cache a context until the TTL or the token's expiry, if still valid."""
+        deadline = time.time() + self.ttl
+        if user_context.expires_at is not None:
+            deadline = min(deadline, user_context.expires_at)
+        if deadline <= time.time():
+            return
+        self._entries[key] = (user_context, deadline)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        self._entries.clear()
+
+
+# Failure results that carry no per-request data are shared
+_MISSING_HEADER_RESULT = JWTParseResult(
+    success=False,
+    error="No authorization header found",
+    error_type="MISSING_HEADER",
+)
+_EMPTY_TOKEN_RESULT = JWTParseResult(
+    success=False,
+    error="Empty token after removing prefix",
+    error_type="EMPTY_TOKEN",
+)
+
+
+class JWTParserMiddleware:
     """
     Middleware to parse JWT tokens and extract user information.
 
+    Implemented as a pure ASGI middleware: the token is read straight from the
+    raw scope headers and the user context is stored in ``scope["state"]``,
+    which backs ``request.state`` for everything further down the stack.
+
     Features:
     - Parses JWT tokens from Authorization header
     - Extracts user information without signature validation
@@ -34,49 +105,72 @@ class JWTParserMiddleware(BaseHTTPMiddleware):
         skip_paths: list[str] = None,
         header_name: str = "authorization",
         token_prefix: str = "Bearer ",
+        include_raw_claims: bool = False,
     ):
         """
         Initialize JWT parser middleware.
 
         Args:
             app: ASGI application
-            skip_paths: List of paths to skip JWT parsing (e.g., health checks, public endpoints)
+            skip_paths: List of paths to skip JWT parsing (e.g., health checks, public endpoints);
+                entries ending in "/*" skip every path under that prefix
             header_name: Header name to look for JWT token (default: "authorization")
             token_prefix: Token prefix to strip from header value (default: "Bearer ")
+            include_raw_claims: Attach the full claims dict to the user context (debugging aid, default: False)
         """
-        super().__init__(app)
+        self.app = app
         self.skip_paths = skip_paths or ["/health", "/metrics", "/docs", "/redoc", "/openapi.json"]
+        self._skip_exact = frozenset(p for p in self.skip_paths if not p.endswith("/*"))
+        self._skip_prefix = tuple(p[:-1] for p in self.skip_paths if p.endswith("/*"))
         self.header_name = header_name.lower()
         self.token_prefix = token_prefix
+        self.include_raw_claims = include_raw_claims
+        # Per instance, since cached contexts depend on this instance's configuration
+        self._token_cache = _TokenCache(maxsize=_TOKEN_CACHE_MAXSIZE, ttl=_TOKEN_CACHE_TTL)
+        # Raw-bytes forms for matching scope headers without decoding them
+        self._header_key = self.header_name.encode("latin-1")
+        self._token_prefix = token_prefix.encode("latin-1")
+        self._invalid_header_result = JWTParseResult(
+            success=False,
+            error=f"Authorization header does not start with '{token_prefix}'",
+            error_type="INVALID_HEADER_FORMAT",
+        )
 
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
-        Process request and parse JWT token if present.
+        Parse the JWT token of an HTTP request, then pass it on.
 
         Args:
-            request: FastAPI request object
-            call_next: Next middleware/handler in chain
-
-        Returns:
-            Response object
+            scope: ASGI connection scope
+            receive: ASGI receive callable
+            send: ASGI send callable
         """
-        # Skip JWT parsing for certain paths
-        if request.url.path in self.skip_paths:
-            return await call_next(request)
+        # Skip non-HTTP connections, CORS preflights and paths that never carry a user,
+        # before touching any header
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        skip_prefix = self._skip_prefix
+        if path in self._skip_exact or (skip_prefix and path.startswith(skip_prefix)):
+            await self.app(scope, receive, send)
+            return
 
         # Get request ID for logging (should be set by logging middleware)
-        request_id = getattr(request.state, "request_id", "unknown")
+        state = scope.setdefault("state", {})
+        request_id = state.get("request_id", "unknown")
 
         # Parse JWT token and extract user information
-        parse_result = await self._parse_jwt_from_request(request, request_id)
+        parse_result = await self._parse_jwt_from_scope(scope, request_id)
 
         # Inject user context into request state
         if parse_result.success and parse_result.user_context:
-            request.state.user_context = parse_result.user_context
-            request.state.user_id = parse_result.user_context.user_id
-            request.state.username = parse_result.user_context.username
-            request.state.user_roles = parse_result.user_context.roles
-            request.state.user_permissions = parse_result.user_context.permissions
+            state["user_context"] = parse_result.user_context
+            state["user_id"] = parse_result.user_context.user_id
+            state["username"] = parse_result.user_context.username
+            # Copies, so handlers can't alter a context shared through the token cache
+            state["user_roles"] = list(parse_result.user_context.roles)
+            state["user_permissions"] = list(parse_result.user_context.permissions)
 
             logger.debug(
                 "JWT parsed successfully",
@@ -89,11 +183,11 @@ class JWTParserMiddleware(BaseHTTPMiddleware):
             )
         else:
             # Set empty user context for unauthenticated requests
-            request.state.user_context = UserContext()
-            request.state.user_id = None
-            request.state.username = None
-            request.state.user_roles = []
-            request.state.user_permissions = []
+            state["user_context"] = ANONYMOUS_CONTEXT
+            state["user_id"] = None
+            state["username"] = None
+            state["user_roles"] = []
+            state["user_permissions"] = []
 
             if parse_result.error:
                 logger.debug(
@@ -106,14 +200,30 @@ class JWTParserMiddleware(BaseHTTPMiddleware):
                 )
 
         # Continue with request processing
-        return await call_next(request)
+        await self.app(scope, receive, send)
+
+    def _get_auth_header(self, scope: Scope) -> bytes | None:
+        """
+        Find the token header among the raw scope headers.
 
-    async def _parse_jwt_from_request(self, request: Request, request_id: str) -> JWTParseResult:
+        Args:
+            scope: ASGI connection scope
+
+        Returns:
+            Raw header value, or None if the header is absent
+        """
+        header_key = self._header_key
+        for name, value in scope["headers"]:
+            if name == header_key:
+                return value
+        return None
+
+    async def _parse_jwt_from_scope(self, scope: Scope, request_id: str) -> JWTParseResult:
         """
         Parse JWT token from request headers.
 
         Args:
-            request: FastAPI request object
+            scope: ASGI connection scope
             request_id: Request ID for logging
 
         Returns:
@@ -121,44 +231,37 @@ class JWTParserMiddleware(BaseHTTPMiddleware):
         """
         try:
             # Extract token from Authorization header
-            auth_header = request.headers.get(self.header_name)
+            auth_header = self._get_auth_header(scope)
             if not auth_header:
-                return JWTParseResult(
-                    success=False,
-                    error="No authorization header found",
-                    error_type="MISSING_HEADER",
-                )
+                return _MISSING_HEADER_RESULT
 
             # Remove token prefix (e.g., "Bearer ")
-            if not auth_header.startswith(self.token_prefix):
-                return JWTParseResult(
-                    success=False,
-                    error=f"Authorization header does not start with '{self.token_prefix}'",
-                    error_type="INVALID_HEADER_FORMAT",
-                )
+            if not auth_header.startswith(self._token_prefix):
+                return self._invalid_header_result
 
-            token = auth_header[len(self.token_prefix) :].strip()
+            token = auth_header[len(self._token_prefix) :].strip()
             if not token:
-                return JWTParseResult(
-                    success=False,
-                    error="Empty token after removing prefix",
-                    error_type="EMPTY_TOKEN",
-                )
-
-            # Parse JWT token without signature verification
-            # Since Kong handles validation, we only need to extract claims
-            try:
-                # Decode without verification to extract claims
-                claims = jwt.get_unverified_claims(token)
-            except JWTError as e:
-                return JWTParseResult(
-                    success=False,
-                    error=f"Failed to decode JWT token: {str(e)}",
-                    error_type="JWT_DECODE_ERROR",
-                )
-
-            # Extract user information from claims
-            user_context = await self._extract_user_context(claims, request_id)
+                return _EMPTY_TOKEN_RESULT
+
+            # Repeated tokens skip decoding entirely
+            cache_key = self._token_cache.key(token)
+            user_context = self._token_cache.get(cache_key)
+            if user_context is None:
+                # Parse JWT token without signature verification
+                # Since Kong handles validation, we only need to extract claims
+                try:
+                    # Decode without verification to extract claims
+                    claims = jwt.get_unverified_claims(token.decode("latin-1"))
+                except JWTError as e:
+                    return JWTParseResult(
+                        success=False,
+                        error=f"Failed to decode JWT token: {str(e)}",
+                        error_type="JWT_DECODE_ERROR",
+                    )
+
+                # Extract user information from claims
+                user_context = await self._extract_user_context(claims, request_id)
+                self._token_cache.set(cache_key, user_context)
 
             return JWTParseResult(
                 success=True,
@@ -234,7 +337,7 @@ class JWTParserMiddleware(BaseHTTPMiddleware):
                 token_type=token_type,
                 issued_at=issued_at,
                 expires_at=expires_at,
-                raw_claims=claims,
+                raw_claims=claims if self.include_raw_claims else None,
             )
 
         except Exception as e:
@@ -249,7 +352,7 @@ class JWTParserMiddleware(BaseHTTPMiddleware):
             # Return minimal user context with available information
             return UserContext(
                 user_id=claims.get("sub"),
-                raw_claims=claims,
+                raw_claims=claims if self.include_raw_claims else None,
             )
 
     def _extract_list_claim(self, claim_value: Any) -> list[str]:
@@ -288,7 +391,7 @@ def get_current_user(request: Request) -> UserContext:
     Returns:
         UserContext object (empty if no user authenticated)
     """
-    return getattr(request.state, "user_context", UserContext())
+    return getattr(request.state, "user_context", ANONYMOUS_CONTEXT)
 
 
 def get_current_user_id(request: Request) -> str | None:
@@ -3,27 +3,33 @@ Logging middleware for FastAPI to capture request/response information.
 """
 
 import contextlib
+import secrets
 import time
-import uuid
-from collections.abc import Callable
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from fastapi import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.core.logging_config import get_logger, log_error, log_request, log_response
+from app.core.logging_models import create_request_context
 
 logger = get_logger(__name__)
 
+# Request bodies are only logged for these text-based content types and below this size
+_LOGGABLE_CONTENT_TYPES = (b"application/json", b"application/xml", b"text/")
+_MAX_LOGGED_BODY_SIZE = 10000
 
-class LoggingMiddleware(BaseHTTPMiddleware):
+# Response header carrying the request ID, pre-encoded as ASGI expects
+_X_REQUEST_ID_HEADER = b"x-request-id"
+
+
+class LoggingMiddleware:
     """
-    Middleware to log HTTP requests and responses with structured logging.
+    Pure ASGI middleware to log HTTP requests and responses with structured logging.
 
     Features:
-    - Generates unique request IDs
-    - Logs request start with method, path, and client info
-    - Logs response with status code and duration
+    - Generates unique request IDs, or reuses one set by an outer middleware
+    - Logs one record per request with method, path, client info, status code and duration
+    - Optionally logs a separate record when the request starts
     - Captures user information if available
     - Handles errors gracefully
     """
@@ -34,44 +40,61 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         skip_paths: list[str] = None,
         log_request_body: bool = False,
         log_response_body: bool = False,
+        log_request_start: bool = False,
     ):
         """
         Initialize logging middleware.
 
         Args:
             app: ASGI application
-            skip_paths: List of paths to skip logging (e.g., health checks)
+            skip_paths: List of paths to skip logging (e.g., health checks); entries ending
+                in "/*" skip every path under that prefix
             log_request_body: Whether to log request body (be careful with sensitive data)
             log_response_body: Whether to log response body (be careful with large responses)
+            log_request_start: Whether to also log a record when the request starts; by default
+                the request fields are folded into the single completion record
         """
-        super().__init__(app)
-        self.skip_paths = skip_paths or ["/health", "/metrics", "/favicon.ico"]
+        self.app = app
+        skip_paths = skip_paths or ["/health", "/metrics", "/favicon.ico"]
+        self._skip_exact = frozenset(p for p in skip_paths if not p.endswith("/*"))
+        self._skip_prefix = tuple(p[:-1] for p in skip_paths if p.endswith("/*"))
         self.log_request_body = log_request_body
         self.log_response_body = log_response_body
+        self.log_request_start = log_request_start
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         Process request and response with logging.
 
         Args:
-            request: FastAPI request object
-            call_next: Next middleware/handler in chain
-
-        Returns:
-            Response object
+            scope: ASGI connection scope
+            receive: ASGI receive channel
+            send: ASGI send channel
         """
-        # Skip logging for certain paths
-        if request.url.path in self.skip_paths:
-            return await call_next(request)
-
-        # Generate unique request ID
-        request_id = str(uuid.uuid4())
-
-        # Add request ID to request state for use in other parts of the application
-        request.state.request_id = request_id
+        # Only HTTP requests are logged; skip configured paths before any work.
+        # The check is inlined (no helper call) since it runs for every request.
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        skip_prefix = self._skip_prefix
+        if path in self._skip_exact or (skip_prefix and path.startswith(skip_prefix)):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope, receive)
+
+        # Reuse the request ID assigned by an outer middleware so every log line
+        # of the request carries the same ID; generate one when running alone
+        request_id = getattr(request.state, "request_id", None)
+        if request_id is None:
+            request_id = secrets.token_hex(8)
+            # Add request ID to request state for use in other parts of the application
+            request.state.request_id = request_id
+        request_id_header = (_X_REQUEST_ID_HEADER, request_id.encode("ascii"))
 
         # Extract client information
-        client_ip = self._get_client_ip(request)
+        client_ip = self._get_client_ip(scope)
         user_agent = request.headers.get("user-agent")
 
         # Extract user information if available (from JWT middleware)
@@ -80,138 +103,224 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         # Extract query parameters
         query_params = dict(request.query_params) if request.query_params else None
 
-        # Log request start
-        start_time = time.time()
+        method = scope["method"]
+        status_code = 500
+        response_size = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+                # Get response size if possible
+                headers = list(message.get("headers", []))
+                for name, value in headers:
+                    if name == b"content-length":
+                        with contextlib.suppress(ValueError):
+                            response_size = int(value)
+                        break
+
+                # Add request ID to response headers for tracing
+                headers.append(request_id_header)
+                message["headers"] = headers
+            await send(message)
+
+        request_context = create_request_context(
+            request_id=request_id,
+            method=method,
+            path=path,
+            user_id=user_id,
+            client_ip=client_ip,
+            user_agent=user_agent,
+            query_params=query_params,
+        )
+
+        start_ns = time.perf_counter_ns()
 
         try:
-            log_request(
-                method=request.method,
-                path=request.url.path,
-                request_id=request_id,
-                user_id=user_id,
-                client_ip=client_ip,
-                user_agent=user_agent,
-                query_params=query_params,
-            )
+            # Log request start only when asked; the completion record carries the same fields
+            if self.log_request_start:
+                log_request(
+                    method=method,
+                    path=path,
+                    request_id=request_id,
+                    user_id=user_id,
+                    client_ip=client_ip,
+                    user_agent=user_agent,
+                    query_params=query_params,
+                )
 
             # Log request body if enabled (be careful with sensitive data)
-            if self.log_request_body and request.method in ["POST", "PUT", "PATCH"]:
-                await self._log_request_body(request, request_id)
+            if self.log_request_body and method in ["POST", "PUT", "PATCH"]:
+                receive = self._capture_request_body(scope, request_id, receive)
 
             # Process request
-            response = await call_next(request)
+            await self.app(scope, receive, send_wrapper)
 
             # Calculate duration
-            duration_ms = (time.time() - start_time) * 1000
-
-            # Get response size if possible
-            response_size = None
-            if hasattr(response, "headers") and "content-length" in response.headers:
-                with contextlib.suppress(ValueError, TypeError):
-                    response_size = int(response.headers["content-length"])
+            duration_ms = (time.perf_counter_ns() - start_ns) / 1_000_000
 
             # Log response
             log_response(
                 request_id=request_id,
-                status_code=response.status_code,
+                status_code=status_code,
                 duration_ms=duration_ms,
                 response_size=response_size,
+                request_context=request_context,
             )
 
-            # Add request ID to response headers for tracing
-            response.headers["X-Request-ID"] = request_id
-
-            return response
-
         except Exception as e:
             # Calculate duration even for errors
-            duration_ms = (time.time() - start_time) * 1000
+            duration_ms = (time.perf_counter_ns() - start_ns) / 1_000_000
 
             # Log error
             log_error(
                 request_id=request_id,
                 error_type=type(e).__name__,
                 error_message=str(e),
-                additional_context={
-                    "method": request.method,
-                    "path": request.url.path,
-                    "duration_ms": duration_ms,
-                },
+                additional_context={**request_context, "duration_ms": duration_ms},
             )
 
             # Re-raise the exception to be handled by error middleware
             raise
 
-    def _get_client_ip(self, request: Request) -> str:
+    def _get_client_ip(self, scope: Scope) -> str:
         """
-        Extract client IP address from request.
+        Extract client IP address from the ASGI scope.
 
         Args:
-            request: FastAPI request object
+            scope: ASGI connection scope
 
         Returns:
             Client IP address
         """
+        # Scan the raw (already lower-cased) headers once for both proxy headers
+        forwarded_for = real_ip = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                forwarded_for = value
+            elif name == b"x-real-ip":
+                real_ip = value
+            else:
+                continue
+            if forwarded_for is not None and real_ip is not None:
+                break
+
         # Check for forwarded headers (common in reverse proxy setups)
-        forwarded_for = request.headers.get("x-forwarded-for")
         if forwarded_for:
             # X-Forwarded-For can contain multiple IPs, take the first one
-            return forwarded_for.split(",")[0].strip()
+            return forwarded_for.split(b",", 1)[0].strip().decode("latin-1")
 
         # Check for real IP header
-        real_ip = request.headers.get("x-real-ip")
         if real_ip:
-            return real_ip
+            return real_ip.decode("latin-1")
 
         # Fall back to client host
-        if request.client:
-            return request.client.host
+        client = scope.get("client")
+        if client:
+            return client[0]
 
         return "unknown"
 
-    async def _log_request_body(self, request: Request, request_id: str) -> None:
+    def _capture_request_body(self, scope: Scope, request_id: str, receive: Receive) -> Receive:
+        """
+        Wrap receive so the request body is captured as the downstream app reads it.
+
+        The body is never read ahead of the app or re-yielded; chunks are copied into
+        a single buffer as they pass through and logged once the last one arrives.
+
+        Args:
+            scope: ASGI connection scope
+            request_id: Unique request identifier
+            receive: Original ASGI receive channel
+
+        Returns:
+            Receive channel the downstream app should use
+        """
+        content_type = self._get_loggable_content_type(scope)
+        if content_type is None:
+            return receive
+
+        captured = bytearray()
+        done = False
+
+        async def receive_wrapper() -> Message:
+            nonlocal done
+            message = await receive()
+            if not done and message["type"] == "http.request":
+                # Stop copying once the body is too large to be logged anyway
+                if len(captured) < _MAX_LOGGED_BODY_SIZE:
+                    captured.extend(message.get("body", b""))
+                if not message.get("more_body", False):
+                    done = True
+                    self._log_request_body(captured, request_id, content_type)
+            return message
+
+        return receive_wrapper
+
+    def _get_loggable_content_type(self, scope: Scope) -> str | None:
+        """
+        Decide from the raw headers whether the request body is worth reading.
+
+        The content type and declared length are checked before the body is read,
+        so binary or oversized uploads are never buffered just to be discarded.
+
+        Args:
+            scope: ASGI connection scope
+
+        Returns:
+            The content-type header value if the body should be logged, otherwise None
+        """
+        content_type = b""
+        content_length = b""
+        for name, value in scope.get("headers", ()):
+            if name == b"content-type":
+                content_type = value
+            elif name == b"content-length":
+                content_length = value
+
+        # Only log text-based content types; parameters such as charset are ignored
+        if not content_type.split(b";", 1)[0].strip().startswith(_LOGGABLE_CONTENT_TYPES):
+            return None
+
+        try:
+            if int(content_length or 0) >= _MAX_LOGGED_BODY_SIZE:
+                return None
+        except ValueError:
+            pass
+
+        return content_type.decode("latin-1")
+
+    def _log_request_body(self, body: bytes | bytearray, request_id: str, content_type: str) -> None:
         """
         Log request body if enabled.
 
         Args:
-            request: FastAPI request object
+            body: Captured request body
             request_id: Unique request identifier
+            content_type: Content type of the body, already checked to be loggable
         """
+        # Only log if body is not empty and not too large (chunked bodies have no length header)
+        if not body or len(body) >= _MAX_LOGGED_BODY_SIZE:
+            return
+
         try:
-            # Read body
-            body = await request.body()
-
-            # Only log if body is not empty and not too large
-            if body and len(body) < 10000:  # Limit to 10KB
-                content_type = request.headers.get("content-type", "")
-
-                # Only log text-based content types
-                if any(ct in content_type for ct in ["application/json", "application/xml", "text/"]):
-                    try:
-                        body_str = body.decode("utf-8")
-                        logger.debug(
-                            "Request body",
-                            extra={
-                                "request_id": request_id,
-                                "content_type": content_type,
-                                "body": body_str,
-                            },
-                        )
-                    except UnicodeDecodeError:
-                        logger.debug(
-                            "Request body (binary)",
-                            extra={
-                                "request_id": request_id,
-                                "content_type": content_type,
-                                "body_size": len(body),
-                            },
-                        )
-        except Exception as e:
-            logger.warning(
-                "Failed to log request body",
+            body_str = body.decode("utf-8")
+            logger.debug(
+                "Request body",
+                extra={
+                    "request_id": request_id,
+                    "content_type": content_type,
+                    "body": body_str,
+                },
+            )
+        except UnicodeDecodeError:
+            logger.debug(
+                "Request body (binary)",
                 extra={
                     "request_id": request_id,
-                    "error": str(e),
+                    "content_type": content_type,
+                    "body_size": len(body),
                 },
             )
 
@@ -224,9 +333,10 @@ def get_request_id(request: Request) -> str:
         request: FastAPI request object
 
     Returns:
-        Request ID or generated UUID if not found
+        Request ID or a newly generated random ID if not found
     """
-    return getattr(request.state, "request_id", str(uuid.uuid4()))
+    request_id = getattr(request.state, "request_id", None)
+    return request_id if request_id is not None else secrets.token_hex(8)
 
 
 def add_log_context(request: Request, **context) -> None:
@@ -237,10 +347,11 @@ def add_log_context(request: Request, **context) -> None:
         request: FastAPI request object
         **context: Additional context to add
     """
-    if not hasattr(request.state, "log_context"):
-        request.state.log_context = {}
+    log_context = getattr(request.state, "log_context", None)
+    if log_context is None:
+        log_context = request.state.log_context = {}
 
-    request.state.log_context.update(context)
+    log_context.update(context)
 
 
 def get_log_context(request: Request) -> dict:
@@ -253,4 +364,4 @@ def get_log_context(request: Request) -> dict:
     Returns:
         Log context dictionary
     """
-    return getattr(request.state, "log_context", {})
+    return getattr(request.state, "log_context", None) or {}
@@ -0,0 +1,85 @@
+"""
+Profiling middleware for finding request hot spots during development.
+
+When enabled, a request carrying the ``profile=1`` query parameter is run under
+a pyinstrument profiler and answered with the HTML call-stack report instead of
+its normal response. Requests without the parameter pass straight through.
+"""
+
+from urllib.parse import parse_qs
+
+from fastapi.responses import HTMLResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pragma: no cover - pyinstrument is an optional development tool
+    Profiler = None  # type: ignore[assignment,misc]
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware that profiles requests on demand with pyinstrument.
+
+    Only meant for development and testing; it is registered when
+    ``settings.PROFILING`` is enabled.
+    """
+
+    def __init__(self, app: ASGIApp, query_param: str = "profile"):
+        """
+        Initialize profiling middleware.
+
+        Args:
+            app: ASGI application
+            query_param: Query parameter that turns profiling on for a request (default: "profile")
+
+        Raises:
+            RuntimeError: If pyinstrument is not installed
+        """
+        if Profiler is None:
+            raise RuntimeError("pyinstrument must be installed to use ProfilingMiddleware")
+        self.app = app
+        self.query_param = query_param
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Profile the request if asked to, otherwise pass it on untouched.
+
+        Args:
+            scope: ASGI connection scope
+            receive: ASGI receive callable
+            send: ASGI send callable
+        """
+        if scope["type"] != "http" or not self._profiling_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        async def discard(message: Message) -> None:
+            # The report replaces the normal response
+            pass
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+
+        response = HTMLResponse(profiler.output_html())
+        await response(scope, receive, send)
+
+    def _profiling_requested(self, scope: Scope) -> bool:
+        """
+        Check whether the request asks to be profiled.
+
+        Args:
+            scope: ASGI connection scope
+
+        Returns:
+            True if the query parameter is set to "1" or "true"
+        """
+        query_string = scope["query_string"]
+        if not query_string:
+            return False
+        values: list[str] = parse_qs(query_string.decode("latin-1")).get(self.query_param, [])
+        return bool(values) and values[-1].lower() in ("1", "true")
@@ -2,14 +2,18 @@
 User context schemas for JWT parsing and user information.
 """
 
-from typing import Any
+from collections.abc import Mapping
+from typing import Any, Final, Self
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 
 
 class UserContext(BaseModel):
     """User context model for storing parsed JWT information."""
 
+    # Instances are shared between requests (token cache, anonymous singleton)
+    model_config = ConfigDict(frozen=True)
+
     user_id: str | None = Field(default=None, description="User ID from JWT token")
     username: str | None = Field(default=None, description="Username from JWT token")
     email: str | None = Field(default=None, description="Email from JWT token")
@@ -20,25 +24,45 @@ class UserContext(BaseModel):
     expires_at: int | None = Field(default=None, description="Token expiration timestamp")
     raw_claims: dict[str, Any] | None = Field(default=None, description="Raw JWT claims for additional data")
 
+    # Set views of roles and permissions for O(1) membership checks
+    _roles_set: frozenset[str] = PrivateAttr(default=frozenset())
+    _permissions_set: frozenset[str] = PrivateAttr(default=frozenset())
+
+    def model_post_init(self, context: Any) -> None:
+        """Build the role and permission sets from the field values."""
+        self._roles_set = frozenset(self.roles)
+        self._permissions_set = frozenset(self.permissions)
+
+    def model_copy(self, *, update: Mapping[str, Any] | None = None, deep: bool = False) -> Self:
+        """Copy the context, rebuilding the role and permission sets from any updated fields."""
+        copied = super().model_copy(update=update, deep=deep)
+        if update:
+            copied.model_post_init(None)
+        return copied
+
     def is_authenticated(self) -> bool:
         """Check if user is authenticated (has valid user_id)."""
         return self.user_id is not None and self.user_id != ""
 
     def has_role(self, role: str) -> bool:
         """Check if user has a specific role."""
-        return role in self.roles
+        return role in self._roles_set
 
     def has_permission(self, permission: str) -> bool:
         """Check if user has a specific permission."""
-        return permission in self.permissions
+        return permission in self._permissions_set
 
     def has_any_role(self, roles: list[str]) -> bool:
         """Check if user has any of the specified roles."""
-        return any(role in self.roles for role in roles)
+        return not self._roles_set.isdisjoint(roles)
 
     def has_all_roles(self, roles: list[str]) -> bool:
         """Check if user has all of the specified roles."""
-        return all(role in self.roles for role in roles)
+        return self._roles_set.issuperset(roles)
+
+
+# Shared context for every unauthenticated request
+ANONYMOUS_CONTEXT: Final[UserContext] = UserContext()
 
 
 class JWTParseResult(BaseModel):
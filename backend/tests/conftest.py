@@ -1,14 +1,57 @@
+from types import MappingProxyType
+
 import pytest
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
+from jose import jwt
 
 from app.main import app
 
+# 測試用 JWT 的 payload 與 secret 固定不變，只需在匯入時編碼一次
+_VALID_JWT = jwt.encode(
+    {
+        "sub": "user123",
+        "username": "testuser",
+        "email": "test@example.com",
+        "roles": ["user", "admin"],
+        "permissions": ["read", "write"],
+    },
+    "test-secret",
+    algorithm="HS256",
+)
 
-@pytest.fixture
+# 最小化的 HTTP ASGI scope；以唯讀 mapping 保存，避免測試之間互相汙染
+_HTTP_SCOPE = MappingProxyType(
+    {
+        "type": "http",
+        "method": "GET",
+        "path": "/api/test",
+        "query_string": b"",
+        "headers": [(b"user-agent", b"TestAgent/1.0")],
+        "client": ("192.168.1.1", 12345),
+    }
+)
+
+
+@pytest.fixture(scope="session")
 def client():
-    """同步測試客戶端"""
-    return TestClient(app)
+    """同步測試客戶端（整個測試 session 共用，lifespan 只執行一次）"""
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def error_client():
+    """錯誤處理測試用客戶端：伺服器例外轉為 500 回應而不在測試中重新拋出"""
+    with TestClient(app, raise_server_exceptions=False) as c:
+        yield c
+
+
+@pytest.fixture(autouse=True)
+def reset_dependency_overrides():
+    """每個測試結束後清除 dependency overrides，維持測試隔離"""
+    yield
+    app.dependency_overrides.clear()
 
 
 @pytest.fixture
@@ -16,3 +59,22 @@ async def async_client():
     """非同步測試客戶端"""
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
+
+
+@pytest.fixture(scope="session")
+def valid_jwt_token():
+    """測試用的有效 JWT token"""
+    return _VALID_JWT
+
+
+@pytest.fixture(scope="session")
+def auth_headers(valid_jwt_token):
+    """帶有測試 JWT 的唯讀 Authorization header"""
+    return MappingProxyType({"Authorization": f"Bearer {valid_jwt_token}"})
+
+
+@pytest.fixture
+def http_scope(request):
+    """每個測試各自一份的 HTTP ASGI scope，可透過 indirect 參數化傳入 dict 覆寫欄位"""
+    # headers 是 list，需另外複製，否則測試間會共用同一份
+    return {**_HTTP_SCOPE, "headers": list(_HTTP_SCOPE["headers"]), **getattr(request, "param", {})}
@@ -75,7 +75,7 @@ class TestFullSystemIntegration:
             assert middleware_data["has_username"] is True
 
             # Verify logging occurred
-            mock_logger.info.assert_called()
+            mock_logger.log.assert_called()
 
     def test_error_handling_with_full_context(self, client, valid_jwt_token):
         """Test error handling with full user and request context."""
@@ -100,7 +100,7 @@ class TestFullSystemIntegration:
             assert data["request_id"] is not None
 
             # Verify both request and error logging occurred
-            mock_logger.info.assert_called()  # Request logging
+            mock_logger.log.assert_called()  # Request logging
             mock_logger.error.assert_called()  # Error logging
 
     def test_configuration_environment_integration(self, client):
@@ -180,7 +180,7 @@ class TestFullSystemIntegration:
             jwt_logger.debug.assert_called()
 
             # Logging middleware should have logged the request
-            logging_logger.info.assert_called()
+            logging_logger.log.assert_called()
 
             # Error handler should be ready (no errors in this case)
             # error_logger might not be called for successful requests
@@ -503,7 +503,7 @@ class TestFullIntegrationSuite:
             assert data["request_id"] is not None
 
             # Verify logging
-            mock_logger.info.assert_called()
+            mock_logger.log.assert_called()
 
         # 4. Test error handling
         with patch("app.core.logging_config.logger") as mock_logger:
@@ -561,7 +561,7 @@ class TestFullIntegrationSuite:
         try:
             with patch("app.core.logging_config.logger") as mock_logger:
                 client.get("/api/v1/test-errors/middleware-chain")
-                checklist_results["logging"] = mock_logger.info.called
+                checklist_results["logging"] = mock_logger.log.called
         except Exception:
             checklist_results["logging"] = False
 
@@ -130,11 +130,13 @@ class TestConfigValidator:
             ENVIRONMENT="production",
             DEBUG=True,  # Should be False in production
             RELOAD=True,  # Should be False in production
+            PROFILING=True,  # Should be False in production
         )
         validator = ConfigValidator(settings)
         assert validator.validate_environment_specific() is False
         assert "DEBUG must be False in production" in validator.errors
         assert "RELOAD must be False in production" in validator.errors
+        assert "PROFILING must be False in production" in validator.errors
 
     def test_validate_all_success(self):
         """Test successful validation of all checks"""
@@ -85,7 +85,7 @@ class TestEndToEndRequestFlows:
             assert len(data["request_id"]) > 0
 
             # Verify logging occurred
-            mock_logger.info.assert_called()
+            mock_logger.log.assert_called()
 
     def test_successful_unauthenticated_request_flow(self, client):
         """Test complete flow for successful unauthenticated request."""
@@ -112,7 +112,7 @@ class TestEndToEndRequestFlows:
             assert data["request_id"] is not None
 
             # Verify logging occurred
-            mock_logger.info.assert_called()
+            mock_logger.log.assert_called()
 
     def test_error_handling_request_flow(self, client, valid_jwt_token):
         """Test complete flow when an error occurs."""
@@ -140,7 +140,7 @@ class TestEndToEndRequestFlows:
             assert data["request_id"] is not None
 
             # Verify logging occurred (both request and error logging)
-            logging_logger.info.assert_called()
+            logging_logger.log.assert_called()
             # Error should be logged by error handler
             error_logger.warning.assert_called()
 
@@ -170,7 +170,7 @@ class TestEndToEndRequestFlows:
             assert data["request_id"] is not None
 
             # Verify logging occurred
-            mock_logger.info.assert_called()
+            mock_logger.log.assert_called()
 
     def test_unexpected_error_request_flow(self, client, valid_jwt_token):
         """Test complete flow when unexpected error occurs."""
@@ -314,7 +314,7 @@ class TestEndToEndRequestFlows:
             assert data["message"] == "Validation passed"
 
             # Verify logging occurred
-            mock_logger.info.assert_called()
+            mock_logger.log.assert_called()
 
     def test_request_flow_with_large_payload(self, client, valid_jwt_token):
         """Test request flow with large payload."""
@@ -336,7 +336,7 @@ class TestEndToEndRequestFlows:
             assert data["message"] == "Validation passed"
 
             # Verify logging occurred
-            mock_logger.info.assert_called()
+            mock_logger.log.assert_called()
 
     def test_request_flow_performance_timing(self, client, valid_jwt_token):
         """Test request flow performance and timing."""
@@ -5,6 +5,7 @@ Unit tests for error handling middleware.
 import json
 import uuid
 from datetime import datetime
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -21,6 +22,29 @@ from app.middleware.error_handler import ErrorHandlerMiddleware
 from app.schemas.error import ErrorResponse, ValidationErrorResponse
 
 
+def raising_app(exc: Exception):
+    """Build an ASGI app that fails with the given exception."""
+
+    async def app(scope, receive, send):
+        raise exc
+
+    return app
+
+
+async def run_middleware(middleware, scope):
+    """Drive the middleware with a single request and collect what it sends."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    return sent
+
+
 class TestErrorHandlerMiddleware:
     """Test cases for ErrorHandlerMiddleware."""
 
@@ -29,6 +53,20 @@ class TestErrorHandlerMiddleware:
         """Create middleware instance for testing."""
         return ErrorHandlerMiddleware(app=MagicMock())
 
+    @pytest.fixture
+    def scope(self):
+        """Create an HTTP scope for testing."""
+        return {
+            "type": "http",
+            "method": "GET",
+            "scheme": "http",
+            "server": ("test.com", 80),
+            "path": "/api/test",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"content-type", b"application/json"), (b"user-agent", b"test")],
+        }
+
     @pytest.fixture
     def mock_request(self):
         """Create mock request for testing."""
@@ -40,51 +78,60 @@ class TestErrorHandlerMiddleware:
         return request
 
     @pytest.mark.asyncio
-    async def test_successful_request(self, middleware, mock_request):
+    async def test_successful_request(self, scope):
         """Test middleware with successful request."""
-        # Mock successful response
-        mock_response = Response(content="success", status_code=200)
-        call_next = AsyncMock(return_value=mock_response)
+        # Inner app sends a normal response
+        app = AsyncMock(side_effect=Response(content="success", status_code=200).__call__)
+        middleware = ErrorHandlerMiddleware(app)
 
         # Process request
-        response = await middleware.dispatch(mock_request, call_next)
+        sent = await run_middleware(middleware, scope)
 
         # Verify response
-        assert response == mock_response
-        assert hasattr(mock_request.state, "request_id")
-        call_next.assert_called_once_with(mock_request)
+        assert sent[0]["status"] == 200
+        assert sent[1]["body"] == b"success"
+        assert "request_id" in scope["state"]
+        app.assert_called_once()
 
     @pytest.mark.asyncio
-    async def test_base_app_exception(self, middleware, mock_request):
+    async def test_non_http_scope_passes_through(self):
+        """Test that non-HTTP scopes are forwarded untouched."""
+        app = AsyncMock()
+        middleware = ErrorHandlerMiddleware(app)
+        scope = {"type": "lifespan"}
+
+        await middleware(scope, AsyncMock(), AsyncMock())
+
+        app.assert_called_once()
+        assert "state" not in scope
+
+    @pytest.mark.asyncio
+    async def test_base_app_exception(self, scope):
         """Test that BaseAppException is re-raised for exception handlers."""
         # Create test exception
         test_exception = ValidationException(
             message="Test validation error",
             details={"field": "test", "value": "invalid"},
         )
-
-        # Mock call_next to raise exception
-        call_next = AsyncMock(side_effect=test_exception)
+        middleware = ErrorHandlerMiddleware(raising_app(test_exception))
 
         # The middleware should re-raise BaseAppException for exception handlers
         with pytest.raises(ValidationException):
-            await middleware.dispatch(mock_request, call_next)
+            await run_middleware(middleware, scope)
 
     @pytest.mark.asyncio
-    async def test_http_exception(self, middleware, mock_request):
+    async def test_http_exception(self, scope):
         """Test that HTTPException is re-raised for exception handlers."""
         # Create test exception
         test_exception = HTTPException(status_code=404, detail="Not found")
-
-        # Mock call_next to raise exception
-        call_next = AsyncMock(side_effect=test_exception)
+        middleware = ErrorHandlerMiddleware(raising_app(test_exception))
 
         # The middleware should re-raise HTTPException for exception handlers
         with pytest.raises(HTTPException):
-            await middleware.dispatch(mock_request, call_next)
+            await run_middleware(middleware, scope)
 
     @pytest.mark.asyncio
-    async def test_request_validation_error(self, middleware, mock_request):
+    async def test_request_validation_error(self, scope):
         """Test that RequestValidationError is re-raised for exception handlers."""
         # Create test validation error
         validation_errors = [
@@ -103,29 +150,24 @@ class TestErrorHandlerMiddleware:
         ]
 
         test_exception = RequestValidationError(validation_errors)
-
-        # Mock call_next to raise exception
-        call_next = AsyncMock(side_effect=test_exception)
+        middleware = ErrorHandlerMiddleware(raising_app(test_exception))
 
         # The middleware should re-raise RequestValidationError for exception handlers
         with pytest.raises(RequestValidationError):
-            await middleware.dispatch(mock_request, call_next)
+            await run_middleware(middleware, scope)
 
     @pytest.mark.asyncio
-    async def test_unexpected_exception(self, middleware, mock_request):
+    async def test_unexpected_exception(self, scope):
         """Test handling of unexpected exceptions."""
         # Create unexpected exception
-        test_exception = ValueError("Unexpected error")
-
-        # Mock call_next to raise exception
-        call_next = AsyncMock(side_effect=test_exception)
+        middleware = ErrorHandlerMiddleware(raising_app(ValueError("Unexpected error")))
 
         with patch.object(middleware, "_log_exception", new_callable=AsyncMock) as mock_log:
-            response = await middleware.dispatch(mock_request, call_next)
+            sent = await run_middleware(middleware, scope)
 
             # Verify response
-            assert response.status_code == 500
-            response_data = json.loads(response.body)
+            assert sent[0]["status"] == 500
+            response_data = json.loads(sent[1]["body"])
 
             assert response_data["error"] == "INTERNAL_SERVER_ERROR"
             assert response_data["message"] == "An unexpected error occurred"
@@ -136,7 +178,20 @@ class TestErrorHandlerMiddleware:
             mock_log.assert_called_once()
 
     @pytest.mark.asyncio
-    async def test_different_app_exceptions(self, middleware, mock_request):
+    async def test_exception_after_response_started(self, scope):
+        """Test that an exception after the response started is re-raised."""
+
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            raise ValueError("Stream broke")
+
+        middleware = ErrorHandlerMiddleware(app)
+
+        with pytest.raises(ValueError):
+            await run_middleware(middleware, scope)
+
+    @pytest.mark.asyncio
+    async def test_different_app_exceptions(self, scope):
         """Test that different application exception types are re-raised for exception handlers."""
         exceptions_to_test = [
             BusinessLogicException("Business error", {"rule": "test"}),
@@ -145,11 +200,11 @@ class TestErrorHandlerMiddleware:
         ]
 
         for exception in exceptions_to_test:
-            call_next = AsyncMock(side_effect=exception)
+            middleware = ErrorHandlerMiddleware(raising_app(exception))
 
             # The middleware should re-raise BaseAppException subclasses for exception handlers
             with pytest.raises(type(exception)):
-                await middleware.dispatch(mock_request, call_next)
+                await run_middleware(middleware, dict(scope))
 
     @pytest.mark.asyncio
     async def test_log_exception_with_sensitive_headers(self, middleware, mock_request):
@@ -182,24 +237,34 @@ class TestErrorHandlerMiddleware:
             assert headers["content-type"] == "application/json"  # Not sensitive
 
     @pytest.mark.asyncio
-    async def test_request_id_generation(self, middleware, mock_request):
+    async def test_request_id_generation(self, scope):
         """Test that request ID is properly generated and used."""
-        test_exception = ValueError("Test error")
-        call_next = AsyncMock(side_effect=test_exception)
+        middleware = ErrorHandlerMiddleware(raising_app(ValueError("Test error")))
 
-        response = await middleware.dispatch(mock_request, call_next)
+        sent = await run_middleware(middleware, scope)
 
         # Verify request ID was set
-        assert hasattr(mock_request.state, "request_id")
-        request_id = mock_request.state.request_id
+        request_id = scope["state"]["request_id"]
 
         # Verify request ID is a valid UUID
         uuid.UUID(request_id)  # This will raise if not valid UUID
 
         # Verify request ID is in response
-        response_data = json.loads(response.body)
+        response_data = json.loads(sent[1]["body"])
         assert response_data["request_id"] == request_id
 
+    @pytest.mark.asyncio
+    async def test_request_id_reused_from_state(self, scope):
+        """Test that a request ID already in the scope state is kept."""
+        middleware = ErrorHandlerMiddleware(raising_app(ValueError("Test error")))
+        scope["state"] = {"request_id": "outer-request-id"}
+
+        sent = await run_middleware(middleware, scope)
+
+        assert scope["state"]["request_id"] == "outer-request-id"
+        assert json.loads(sent[1]["body"])["request_id"] == "outer-request-id"
+        assert (b"x-request-id", b"outer-request-id") in sent[0]["headers"]
+
 
 class TestErrorResponseModels:
     """Test cases for error response models."""
@@ -268,13 +333,12 @@ class TestExceptionHandlers:
     @pytest.fixture
     def mock_request(self):
         """Create mock request for testing."""
-        request = MagicMock(spec=Request)
-        request.method = "GET"
-        request.url = "http://test.com/api/test"
-        request.headers = {"content-type": "application/json", "user-agent": "test"}
-        request.state = MagicMock()
-        request.state.request_id = "test-123"
-        return request
+        return SimpleNamespace(
+            method="GET",
+            url="http://test.com/api/test",
+            headers={"content-type": "application/json", "user-agent": "test"},
+            state=SimpleNamespace(request_id="test-123"),
+        )
 
     @pytest.mark.asyncio
     async def test_handle_http_exception(self, mock_request):
@@ -3,7 +3,8 @@ Tests for JWT parser middleware.
 """
 
 import time
-from unittest.mock import MagicMock, patch
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from fastapi import FastAPI, Request
@@ -18,7 +19,7 @@ from app.middleware.jwt_parser import (
     require_permission,
     require_role,
 )
-from app.schemas.user import UserContext
+from app.schemas.user import ANONYMOUS_CONTEXT, UserContext
 
 
 class TestJWTParserMiddleware:
@@ -308,42 +309,33 @@ class TestJWTParserHelpers:
 
     def test_get_current_user_with_context(self):
         """Test get_current_user returns user context from request state."""
-        request = MagicMock(spec=Request)
         user_context = UserContext(user_id="user123")
-        request.state.user_context = user_context
+        request = SimpleNamespace(state=SimpleNamespace(user_context=user_context))
 
         result = get_current_user(request)
         assert result.user_id == "user123"
 
     def test_get_current_user_without_context(self):
         """Test get_current_user returns empty context when not in request state."""
-        request = MagicMock(spec=Request)
-        request.state = MagicMock()
-        del request.state.user_context  # Simulate missing attribute
+        request = SimpleNamespace(state=SimpleNamespace())
 
-        with patch("app.middleware.jwt_parser.getattr") as mock_getattr:
-            mock_getattr.return_value = UserContext()
-            result = get_current_user(request)
-            assert result.user_id is None
+        result = get_current_user(request)
+        assert result is ANONYMOUS_CONTEXT
+        assert result.user_id is None
 
     def test_get_current_user_id_with_user(self):
         """Test get_current_user_id returns user ID from request state."""
-        request = MagicMock(spec=Request)
-        request.state.user_id = "user123"
+        request = SimpleNamespace(state=SimpleNamespace(user_id="user123"))
 
         result = get_current_user_id(request)
         assert result == "user123"
 
     def test_get_current_user_id_without_user(self):
         """Test get_current_user_id returns None when not in request state."""
-        request = MagicMock(spec=Request)
-        request.state = MagicMock()
-        del request.state.user_id  # Simulate missing attribute
+        request = SimpleNamespace(state=SimpleNamespace())
 
-        with patch("app.middleware.jwt_parser.getattr") as mock_getattr:
-            mock_getattr.return_value = None
-            result = get_current_user_id(request)
-            assert result is None
+        result = get_current_user_id(request)
+        assert result is None
 
 
 class TestJWTParserMiddlewareInternal:
@@ -420,6 +412,87 @@ class TestJWTParserMiddlewareInternal:
         assert result.expires_at == 1234571490
         assert result.token_type == "access"
 
+    @pytest.mark.asyncio
+    async def test_extract_user_context_include_raw_claims(self):
+        """Test raw claims are attached only when the middleware is asked to keep them."""
+        middleware = JWTParserMiddleware(MagicMock(), include_raw_claims=True)
+        claims = {"sub": "user123", "roles": ["admin"], "custom": "value"}
+
+        result = await middleware._extract_user_context(claims, "req123")
+
+        assert result.user_id == "user123"
+        assert result.raw_claims == claims
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        ("method", "path"),
+        [("GET", "/health"), ("GET", "/metrics/app"), ("OPTIONS", "/api/v1/users")],
+    )
+    async def test_skipped_requests_are_not_parsed(self, method, path):
+        """Test skip paths, prefix skips and CORS preflights bypass JWT parsing."""
+        app = AsyncMock()
+        middleware = JWTParserMiddleware(app, skip_paths=["/health", "/metrics/*"])
+        scope = {"type": "http", "method": method, "path": path, "headers": []}
+
+        with patch.object(middleware, "_parse_jwt_from_scope") as mock_parse:
+            await middleware(scope, AsyncMock(), AsyncMock())
+
+        mock_parse.assert_not_called()
+        app.assert_awaited_once()
+        assert "state" not in scope
+
+    @pytest.mark.asyncio
+    async def test_parse_jwt_from_scope_cached(self, middleware):
+        """Test repeated tokens are served from the token cache without decoding."""
+        token = jwt.encode({"sub": "user123", "exp": int(time.time()) + 3600}, "test-secret", algorithm="HS256")
+        scope = {"headers": [(b"authorization", f"Bearer {token}".encode())]}
+
+        with patch("app.middleware.jwt_parser.jwt.get_unverified_claims", wraps=jwt.get_unverified_claims) as mock_decode:
+            first = await middleware._parse_jwt_from_scope(scope, "req123")
+            second = await middleware._parse_jwt_from_scope(scope, "req456")
+
+        mock_decode.assert_called_once()
+        assert second.user_context is first.user_context
+        assert second.user_context.user_id == "user123"
+
+    @pytest.mark.asyncio
+    async def test_token_cache_is_per_instance(self):
+        """Test contexts cached by one middleware are not served by another with different settings."""
+        token = jwt.encode({"sub": "user123", "exp": int(time.time()) + 3600}, "test-secret", algorithm="HS256")
+        scope = {"headers": [(b"authorization", f"Bearer {token}".encode())]}
+        with_claims = JWTParserMiddleware(MagicMock(), include_raw_claims=True)
+        without_claims = JWTParserMiddleware(MagicMock())
+
+        first = await with_claims._parse_jwt_from_scope(scope, "req123")
+        second = await without_claims._parse_jwt_from_scope(scope, "req456")
+
+        assert first.user_context.raw_claims["sub"] == "user123"
+        assert second.user_context.raw_claims is None
+
+    @pytest.mark.asyncio
+    async def test_parse_jwt_from_scope_expired_not_cached(self, middleware):
+        """Test tokens that are already expired are decoded every time."""
+        token = jwt.encode({"sub": "user123", "exp": int(time.time()) - 60}, "test-secret", algorithm="HS256")
+        scope = {"headers": [(b"authorization", f"Bearer {token}".encode())]}
+
+        with patch("app.middleware.jwt_parser.jwt.get_unverified_claims", wraps=jwt.get_unverified_claims) as mock_decode:
+            await middleware._parse_jwt_from_scope(scope, "req123")
+            result = await middleware._parse_jwt_from_scope(scope, "req456")
+
+        assert mock_decode.call_count == 2
+        assert result.user_context.user_id == "user123"
+
+    @pytest.mark.asyncio
+    async def test_parse_jwt_from_scope_rejects_mistyped_claims(self, middleware):
+        """Test claims of the wrong type leave the request unauthenticated."""
+        token = jwt.encode({"sub": 123, "iat": "yesterday"}, "test-secret", algorithm="HS256")
+        scope = {"headers": [(b"authorization", f"Bearer {token}".encode())]}
+
+        result = await middleware._parse_jwt_from_scope(scope, "req123")
+
+        assert result.success is False
+        assert result.user_context is None
+
     @pytest.mark.asyncio
     async def test_extract_user_context_with_exception(self, middleware):
         """Test _extract_user_context handles exceptions gracefully."""
@@ -431,4 +504,4 @@ class TestJWTParserMiddlewareInternal:
 
             # Should return minimal context with available information
             assert result.user_id == "user123"
-            assert result.raw_claims == claims
+            assert result.raw_claims is None
@@ -4,6 +4,9 @@ Tests for logging configuration.
 
 from unittest.mock import Mock, patch
 
+import pytest
+
+from app.core.config import Settings
 from app.core.logging_config import (
     get_logger,
     log_error,
@@ -14,12 +17,15 @@ from app.core.logging_config import (
     setup_logging,
 )
 
+# Attribute names of Settings (fields and methods) for spec'd settings mocks
+SETTINGS_SPEC = [*Settings.model_fields, *(name for name in dir(Settings) if not name.startswith("_"))]
+
 
 class TestSetupLogging:
     """Test setup_logging function"""
 
     @patch("app.core.logging_config.logger")
-    @patch("app.core.logging_config.settings")
+    @patch("app.core.logging_config.settings", spec_set=SETTINGS_SPEC)
     def test_setup_logging_creates_log_directory(self, mock_settings, mock_logger):
         """Test that setup_logging creates logs directory"""
         mock_settings.is_development.return_value = True
@@ -48,7 +54,7 @@ class TestSetupLogging:
 
             mock_log_dir.mkdir.assert_called_once_with(exist_ok=True)
 
-    @patch("app.core.logging_config.settings")
+    @patch("app.core.logging_config.settings", spec_set=SETTINGS_SPEC)
     @patch("app.core.logging_config.logger")
     def test_setup_logging_development_format(self, mock_logger, mock_settings):
         """Test setup_logging with development environment"""
@@ -56,6 +62,7 @@ class TestSetupLogging:
         mock_settings.is_production.return_value = False
         mock_settings.LOG_LEVEL = "DEBUG"
         mock_settings.LOG_FILE_PATH = "logs/test.log"
+        mock_settings.get_log_file_path.return_value = "logs/test.log"
 
         setup_logging()
 
@@ -63,7 +70,7 @@ class TestSetupLogging:
         assert mock_logger.add.call_count >= 3
         assert mock_logger.remove.called
 
-    @patch("app.core.logging_config.settings")
+    @patch("app.core.logging_config.settings", spec_set=SETTINGS_SPEC)
     @patch("app.core.logging_config.logger")
     def test_setup_logging_production_format(self, mock_logger, mock_settings):
         """Test setup_logging with production environment"""
@@ -71,6 +78,7 @@ class TestSetupLogging:
         mock_settings.is_production.return_value = True
         mock_settings.LOG_LEVEL = "INFO"
         mock_settings.LOG_FILE_PATH = "logs/test.log"
+        mock_settings.get_log_file_path.return_value = "logs/test.log"
 
         setup_logging()
 
@@ -78,6 +86,21 @@ class TestSetupLogging:
         assert mock_logger.add.call_count >= 4  # console, file, error file, stderr
         assert mock_logger.remove.called
 
+    @pytest.mark.parametrize("enqueue", [True, False])
+    @patch("app.core.logging_config.settings", spec_set=SETTINGS_SPEC)
+    @patch("app.core.logging_config.logger")
+    def test_setup_logging_enqueue(self, mock_logger, mock_settings, enqueue):
+        """Test setup_logging passes LOG_ENQUEUE to every sink"""
+        mock_settings.is_development.return_value = False
+        mock_settings.is_production.return_value = True
+        mock_settings.LOG_LEVEL = "INFO"
+        mock_settings.LOG_ENQUEUE = enqueue
+        mock_settings.get_log_file_path.return_value = "logs/test.log"
+
+        setup_logging()
+
+        assert all(call.kwargs["enqueue"] is enqueue for call in mock_logger.add.call_args_list)
+
 
 class TestGetLogger:
     """Test get_logger function"""
@@ -264,6 +287,38 @@ class TestLogResponse:
 
         mock_logger.log.assert_called_once_with("ERROR", "Request completed: 500 (1000.00ms)", extra=mock_context)
 
+    @patch("app.core.logging_config.logger")
+    def test_log_response_with_request_context(self, mock_logger):
+        """Test log_response merges request fields into a single record"""
+        request_context = {
+            "request_id": "req_123",
+            "method": "GET",
+            "path": "/test",
+            "client_ip": "192.168.1.1",
+        }
+
+        log_response(
+            request_id="req_123",
+            status_code=200,
+            duration_ms=12.5,
+            response_size=42,
+            request_context=request_context,
+        )
+
+        mock_logger.log.assert_called_once_with(
+            "INFO",
+            "Request completed: GET /test 200 (12.50ms)",
+            extra={
+                "request_id": "req_123",
+                "method": "GET",
+                "path": "/test",
+                "client_ip": "192.168.1.1",
+                "status_code": 200,
+                "duration_ms": 12.5,
+                "response_size": 42,
+            },
+        )
+
 
 class TestLogError:
     """Test log_error function"""
@@ -3,46 +3,100 @@ Comprehensive tests for logging and error handling functionality verification.
 Tests log output, error formatting, and integration between logging and error handling.
 """
 
+import asyncio
 import json
-import tempfile
-from pathlib import Path
+import re
+from datetime import UTC, datetime
+from operator import itemgetter
 from unittest.mock import patch
 
+import httpx
 import pytest
-from fastapi.testclient import TestClient
-from jose import jwt
+from freezegun import freeze_time
 
+from app.core.config import settings
 from app.core.logging_config import get_logger, setup_logging
-from app.core.logging_models import LogEntry
+from app.core.logging_models import LogEntry, format_log_record
 from app.main import app
 
+FROZEN_TIME = "2024-01-01T00:00:00Z"
+
+ERROR_CASES = [
+    ("/api/v1/test-errors/app-exception", 422, "VALIDATION_ERROR"),
+    ("/api/v1/test-errors/http-exception", 404, "HTTP_ERROR"),
+    ("/api/v1/test-errors/business-logic-error", 400, "BUSINESS_LOGIC_ERROR"),
+    ("/api/v1/test-errors/database-error", 500, "DATABASE_ERROR"),
+    ("/api/v1/test-errors/external-service-error", 502, "EXTERNAL_SERVICE_ERROR"),
+    ("/api/v1/test-errors/unexpected-error", 500, "INTERNAL_SERVER_ERROR"),
+]
+
+# Patterns that must never appear in an error response body
+SENSITIVE_RE = re.compile(
+    "|".join(
+        re.escape(p)
+        for p in [
+            "/app/",
+            "Traceback",
+            'File "',
+            "line ",
+            "ZeroDivisionError",  # Internal exception details
+        ]
+    )
+)
+SENSITIVE_DB_RE = re.compile(
+    "|".join(re.escape(p) for p in ["postgresql://", "password", "connection string", "database host"]),
+    re.IGNORECASE,
+)
 
-@pytest.fixture
-def client():
-    """Create test client."""
-    return TestClient(app)
+
+_REQUIRED = itemgetter("error", "message", "timestamp", "request_id")
+
+
+def _required_fields(data: dict, endpoint: str) -> tuple:
+    """Return the fields every error response must carry, failing if one is missing."""
+    try:
+        return _REQUIRED(data)
+    except KeyError as e:
+        pytest.fail(f"Missing {e.args[0]} in response from {endpoint}")
+
+
+def _call_text(call) -> str:
+    """Join a mocked log call's message with its extra keys and values.
+
+    Cheaper than str(call), which renders the full mock call repr.
+    """
+    message = call.args[0] if call.args else ""
+    extra = call.kwargs.get("extra") or {}
+    return " ".join([message, *extra, *map(str, extra.values())])
 
 
 @pytest.fixture
-def valid_jwt_token():
-    """Create a valid JWT token for testing."""
-    payload = {
-        "sub": "user123",
-        "username": "testuser",
-        "email": "test@example.com",
-        "roles": ["user"],
-        "permissions": ["read", "write"],
-    }
-    return jwt.encode(payload, "test-secret", algorithm="HS256")
+def configured_logger(request, tmp_path, monkeypatch):
+    """Run setup_logging() against a temporary log file and return its path.
+
+    The path relative to tmp_path defaults to "test.log" and can be overridden
+    through indirect parametrization. The app's logging configuration is
+    restored afterwards so the temporary sinks don't leak into other tests.
+    """
+    log_file = tmp_path / getattr(request, "param", "test.log")
+    # setup_logging() reads the path from get_log_file_path(), not LOG_FILE_PATH
+    monkeypatch.setattr(type(settings), "get_log_file_path", lambda self: str(log_file))
+    monkeypatch.setattr(settings, "LOG_FORMAT", "json")
+    monkeypatch.setattr(settings, "LOG_LEVEL", "INFO")
+
+    setup_logging()
+    yield log_file
+
+    # Drop the temporary sinks and reinstall the app's own
+    monkeypatch.undo()
+    setup_logging()
 
 
 @pytest.fixture
-def temp_log_file():
-    """Create a temporary log file for testing."""
-    with tempfile.NamedTemporaryFile(mode="w+", suffix=".log", delete=False) as f:
-        yield f.name
-    # Cleanup
-    Path(f.name).unlink(missing_ok=True)
+def mock_logger():
+    """Patch the logging_config logger for the duration of a test."""
+    with patch("app.core.logging_config.logger") as m:
+        yield m
 
 
 class TestLoggingFunctionality:
@@ -58,27 +112,28 @@ class TestLoggingFunctionality:
         assert hasattr(logger, "error")
         assert hasattr(logger, "debug")
 
-    def test_structured_logging_format(self, temp_log_file):
+    def test_structured_logging_format(self):
         """Test structured logging format (JSON)."""
-        # Setup logging with temporary file
-        with patch("app.core.logging_config.settings") as mock_settings:
-            mock_settings.LOG_FILE_PATH = temp_log_file
-            mock_settings.LOG_FORMAT = "json"
-            mock_settings.LOG_LEVEL = "INFO"
-
-            setup_logging()
-            logger = get_logger("test_structured")
+        logger = get_logger("test_structured")
 
+        # Capture the app's JSON lines in memory instead of reading a log file back
+        lines = []
+        sink_id = logger.add(lambda message: lines.append(format_log_record(message.record)), level="INFO")
+        try:
             # Log a test message
             test_data = {"user_id": "user123", "action": "test_action", "details": {"key": "value"}}
             logger.info("Test structured log", extra=test_data)
+        finally:
+            logger.remove(sink_id)
 
-            # Read and verify log file
-            log_content = Path(temp_log_file).read_text()
-            assert len(log_content.strip()) > 0
+        assert len(lines) == 1
+        log_record = json.loads(lines[-1])
 
-            # Should contain structured data
-            assert "user_id" in log_content or "Test structured log" in log_content
+        # Should contain structured data, with extra fields flattened to the top level
+        assert log_record["level"] == "INFO"
+        assert log_record["message"] == "Test structured log"
+        assert log_record["user_id"] == "user123"
+        assert log_record["details"] == {"key": "value"}
 
     def test_log_levels(self):
         """Test different log levels."""
@@ -94,12 +149,11 @@ class TestLoggingFunctionality:
             # Verify all levels were called
             assert mock_log.call_count >= 4  # Depending on log level configuration
 
+    @freeze_time(FROZEN_TIME)
     def test_log_entry_model(self):
         """Test LogEntry model validation."""
-        from datetime import datetime
-
         log_entry = LogEntry(
-            timestamp=datetime.now(),
+            timestamp=datetime(2024, 1, 1, tzinfo=UTC),
             level="INFO",
             message="Test message",
             request_id="req_123",
@@ -120,105 +174,78 @@ class TestLoggingFunctionality:
         assert log_entry.status_code == 200
         assert log_entry.duration_ms == 150.5
         assert log_entry.extra == {"key": "value"}
+        assert log_entry.timestamp == datetime(2024, 1, 1, tzinfo=UTC)
 
-    def test_logging_middleware_integration(self, client):
-        """Test logging middleware integration."""
-        with patch("app.core.logging_config.logger") as mock_logger:
-            response = client.get("/api/v1/test-errors/middleware-chain")
-
-            assert response.status_code == 200
-
-            # Verify logging middleware logged the request
-            mock_logger.info.assert_called()
+        # Default timestamp comes from the (frozen) current time
+        assert LogEntry(level="INFO", message="Test message").timestamp == datetime(2024, 1, 1, tzinfo=UTC)
 
-            # Check log calls for request information
-            log_calls = mock_logger.info.call_args_list
-            request_logged = any("Request" in str(call) or "GET" in str(call) for call in log_calls)
-            assert request_logged
+    def test_middleware_chain_logging(self, client, auth_headers, mock_logger):
+        """Test request logging, correlation and timing for a single middleware chain request."""
+        response = client.get("/api/v1/test-errors/middleware-chain", headers=auth_headers)
 
-    def test_request_response_logging(self, client, valid_jwt_token):
-        """Test request and response logging."""
-        headers = {"Authorization": f"Bearer {valid_jwt_token}"}
-
-        with patch("app.core.logging_config.logger") as mock_logger:
-            response = client.get("/api/v1/test-errors/middleware-chain", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
 
-            assert response.status_code == 200
+        # Verify logging middleware logged the request
+        mock_logger.log.assert_called()
+        log_calls = mock_logger.log.call_args_list
+        log_texts = [_call_text(call) for call in log_calls]
+        assert any("Request" in text or "GET" in text for text in log_texts)
 
-            # Verify request logging
-            mock_logger.info.assert_called()
+        # Request ID is exposed for log correlation
+        assert data["request_id"]
 
-            # Check that user context is logged
-            log_calls = mock_logger.info.call_args_list
-            user_logged = any("user123" in str(call) or "testuser" in str(call) for call in log_calls)
-            # User logging might be in debug level or different format
+        # Check for duration/timing information
+        assert any("duration" in text.lower() or "ms" in text or "completed" in text for text in log_texts)
 
-    def test_error_logging_integration(self, client):
+    def test_error_logging_integration(self, client, mock_logger):
         """Test error logging integration."""
-        with patch("app.core.logging_config.logger") as mock_logger:
-            response = client.get("/api/v1/test-errors/app-exception")
-
-            assert response.status_code == 422
-
-            # Verify error was logged
-            mock_logger.error.assert_called()
-
-            # Check error log content
-            error_calls = mock_logger.error.call_args_list
-            error_logged = any("ValidationException" in str(call) or "validation error" in str(call) for call in error_calls)
-            assert error_logged
-
-    def test_performance_logging(self, client):
-        """Test performance metrics logging."""
-        with patch("app.core.logging_config.logger") as mock_logger:
-            response = client.get("/api/v1/test-errors/middleware-chain")
+        response = client.get("/api/v1/test-errors/app-exception")
 
-            assert response.status_code == 200
+        assert response.status_code == 422
 
-            # Verify performance metrics are logged
-            mock_logger.info.assert_called()
+        # Verify error was logged
+        mock_logger.error.assert_called()
 
-            # Check for duration/timing information
-            log_calls = mock_logger.info.call_args_list
-            timing_logged = any(
-                "duration" in str(call).lower() or "ms" in str(call) or "completed" in str(call) for call in log_calls
-            )
-            assert timing_logged
+        # Check error log content
+        error_calls = mock_logger.error.call_args_list
+        error_logged = any("ValidationException" in text or "validation error" in text for text in map(_call_text, error_calls))
+        assert error_logged
 
 
 class TestErrorHandlingFunctionality:
     """Test error handling functionality and formatting."""
 
-    def test_custom_exception_handling(self, client):
-        """Test custom exception handling."""
-        response = client.get("/api/v1/test-errors/app-exception")
+    @freeze_time(FROZEN_TIME)
+    @pytest.mark.parametrize("endpoint,status,code", ERROR_CASES)
+    def test_error_response(self, error_client, endpoint, status, code):
+        """Test that error endpoints return the expected status and a consistent structure."""
+        response = error_client.get(endpoint)
 
-        assert response.status_code == 422
+        assert response.status_code == status
         data = response.json()
 
-        # Verify error response structure
-        assert "error" in data
-        assert "message" in data
-        assert "timestamp" in data
-        assert "request_id" in data
-        assert data["error"] == "VALIDATION_ERROR"
-        assert "test validation error" in data["message"]
+        error, _, timestamp, request_id = _required_fields(data, endpoint)
 
-    def test_http_exception_handling(self, client):
-        """Test HTTP exception handling."""
-        response = client.get("/api/v1/test-errors/http-exception")
+        assert error == code
+        assert timestamp == "2024-01-01T00:00:00+00:00"
+        assert len(request_id) > 0
 
-        assert response.status_code == 404
-        data = response.json()
+    @pytest.mark.asyncio
+    async def test_error_response_consistency(self):
+        """Test that concurrent error responses keep a consistent structure."""
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            responses = await asyncio.gather(*(ac.get(endpoint) for endpoint, _, _ in ERROR_CASES))
 
-        # Verify error response structure
-        assert "error" in data
-        assert "message" in data
-        assert "timestamp" in data
-        assert "request_id" in data
-        assert data["error"] == "NOT_FOUND"
+        request_ids = set()
+        for (endpoint, _, _), response in zip(ERROR_CASES, responses, strict=True):
+            *_, request_id = _required_fields(response.json(), endpoint)
+            request_ids.add(request_id)
 
-    def test_validation_exception_handling(self, client):
+        # Overlapping requests must not share request state
+        assert len(request_ids) == len(ERROR_CASES)
+
+    def test_validation_exception_handling(self, error_client):
         """Test validation exception handling."""
         invalid_data = {
             "name": "",  # Too short
@@ -226,7 +253,7 @@ class TestErrorHandlingFunctionality:
             "age": -5,  # Invalid age
         }
 
-        response = client.post("/api/v1/test-errors/validation-error", json=invalid_data)
+        response = error_client.post("/api/v1/test-errors/validation-error", json=invalid_data)
 
         assert response.status_code == 422
         data = response.json()
@@ -238,95 +265,15 @@ class TestErrorHandlingFunctionality:
         assert "request_id" in data
         assert data["error"] == "VALIDATION_ERROR"
 
-    def test_unexpected_exception_handling(self, client):
-        """Test unexpected exception handling."""
-        response = client.get("/api/v1/test-errors/unexpected-error")
-
-        assert response.status_code == 500
-        data = response.json()
-
-        # Verify error response structure
-        assert "error" in data
-        assert "message" in data
-        assert "timestamp" in data
-        assert "request_id" in data
-        assert data["error"] == "INTERNAL_SERVER_ERROR"
-
-    def test_business_logic_exception_handling(self, client):
-        """Test business logic exception handling."""
-        response = client.get("/api/v1/test-errors/business-logic-error")
-
-        assert response.status_code == 422
-        data = response.json()
-
-        # Verify error response structure
-        assert "error" in data
-        assert "message" in data
-        assert "timestamp" in data
-        assert "request_id" in data
-        assert data["error"] == "BUSINESS_LOGIC_ERROR"
-
-    def test_database_exception_handling(self, client):
-        """Test database exception handling."""
-        response = client.get("/api/v1/test-errors/database-error")
-
-        assert response.status_code == 500
-        data = response.json()
-
-        # Verify error response structure
-        assert "error" in data
-        assert "message" in data
-        assert "timestamp" in data
-        assert "request_id" in data
-        assert data["error"] == "DATABASE_ERROR"
-
-    def test_external_service_exception_handling(self, client):
-        """Test external service exception handling."""
-        response = client.get("/api/v1/test-errors/external-service-error")
-
-        assert response.status_code == 502
-        data = response.json()
-
-        # Verify error response structure
-        assert "error" in data
-        assert "message" in data
-        assert "timestamp" in data
-        assert "request_id" in data
-        assert data["error"] == "EXTERNAL_SERVICE_ERROR"
-
-    def test_error_response_consistency(self, client):
-        """Test that all error responses have consistent structure."""
-        error_endpoints = [
-            "/api/v1/test-errors/app-exception",
-            "/api/v1/test-errors/http-exception",
-            "/api/v1/test-errors/business-logic-error",
-            "/api/v1/test-errors/database-error",
-            "/api/v1/test-errors/external-service-error",
-            "/api/v1/test-errors/unexpected-error",
-        ]
-
-        for endpoint in error_endpoints:
-            response = client.get(endpoint)
-            data = response.json()
-
-            # All error responses should have these fields
-            required_fields = ["error", "message", "timestamp", "request_id"]
-            for field in required_fields:
-                assert field in data, f"Missing {field} in response from {endpoint}"
-
-            # Verify timestamp format
-            assert len(data["timestamp"]) > 0
-
-            # Verify request_id format
-            assert len(data["request_id"]) > 0
-
-    def test_error_details_inclusion(self, client):
+    def test_error_details_inclusion(self, error_client):
         """Test that error details are properly included when available."""
-        response = client.get("/api/v1/test-errors/app-exception")
+        response = error_client.get("/api/v1/test-errors/app-exception")
 
         assert response.status_code == 422
         data = response.json()
 
+        assert "test validation error" in data["message"]
+
         # Should include details for custom exceptions
         if "details" in data:
             assert isinstance(data["details"], dict)
@@ -335,157 +282,98 @@ class TestErrorHandlingFunctionality:
 class TestLoggingErrorIntegration:
     """Test integration between logging and error handling."""
 
-    def test_error_logging_with_user_context(self, client, valid_jwt_token):
+    def test_error_logging_with_user_context(self, client, auth_headers, mock_logger):
         """Test error logging includes user context."""
-        headers = {"Authorization": f"Bearer {valid_jwt_token}"}
+        response = client.get("/api/v1/test-errors/app-exception", headers=auth_headers)
 
-        with patch("app.core.logging_config.logger") as mock_logger:
-            response = client.get("/api/v1/test-errors/app-exception", headers=headers)
-
-            assert response.status_code == 422
+        assert response.status_code == 422
 
-            # Verify error was logged
-            mock_logger.error.assert_called()
+        # Verify error was logged
+        mock_logger.error.assert_called()
 
-            # Check that user context might be included in error logs
-            error_calls = mock_logger.error.call_args_list
-            # User context logging depends on implementation
+        # Check that user context might be included in error logs
+        error_calls = mock_logger.error.call_args_list
+        # User context logging depends on implementation
 
-    def test_error_logging_with_request_id(self, client):
+    def test_error_logging_with_request_id(self, client, mock_logger):
         """Test error logging includes request ID."""
-        with patch("app.core.logging_config.logger") as mock_logger:
-            response = client.get("/api/v1/test-errors/app-exception")
+        response = client.get("/api/v1/test-errors/app-exception")
 
-            assert response.status_code == 422
-            data = response.json()
+        assert response.status_code == 422
+        data = response.json()
 
-            # Verify error was logged
-            mock_logger.error.assert_called()
+        # Verify error was logged
+        mock_logger.error.assert_called()
 
-            # Request ID should be in response
-            assert "request_id" in data
-            assert len(data["request_id"]) > 0
+        # Request ID should be in response
+        assert "request_id" in data
+        assert len(data["request_id"]) > 0
 
-    def test_request_logging_with_error_outcome(self, client):
+    def test_request_logging_with_error_outcome(self, client, mock_logger):
         """Test request logging includes error status codes."""
-        with patch("app.core.logging_config.logger") as mock_logger:
-            response = client.get("/api/v1/test-errors/app-exception")
+        response = client.get("/api/v1/test-errors/app-exception")
 
-            assert response.status_code == 422
+        assert response.status_code == 422
 
-            # Verify request completion was logged with error status
-            mock_logger.info.assert_called()
+        # Verify request completion was logged with error status
+        mock_logger.log.assert_called()
 
-            # Check for status code in logs
-            log_calls = mock_logger.info.call_args_list
-            status_logged = any("422" in str(call) or "error" in str(call).lower() for call in log_calls)
-            # Status code logging depends on implementation
+        # Check for status code in logs
+        log_calls = mock_logger.log.call_args_list
+        assert any("422" in text for text in map(_call_text, log_calls))
 
-    def test_middleware_error_handling(self, client):
+    def test_middleware_error_handling(self, client, mock_logger):
         """Test middleware error handling doesn't break logging."""
         # Test with malformed JWT to trigger middleware error
         headers = {"Authorization": "Bearer malformed.token"}
 
-        with patch("app.core.logging_config.logger") as mock_logger:
-            response = client.get("/api/v1/test-errors/middleware-chain", headers=headers)
+        response = client.get("/api/v1/test-errors/middleware-chain", headers=headers)
 
-            # Should still succeed (JWT errors are non-blocking)
-            assert response.status_code == 200
+        # Should still succeed (JWT errors are non-blocking)
+        assert response.status_code == 200
 
-            # Should still log the request
-            mock_logger.info.assert_called()
+        # Should still log the request
+        mock_logger.log.assert_called()
 
-            # Should log JWT parsing warning
-            mock_logger.warning.assert_called()
-
-    def test_log_correlation_across_middleware(self, client, valid_jwt_token):
-        """Test log correlation across middleware chain."""
-        headers = {"Authorization": f"Bearer {valid_jwt_token}"}
-
-        with patch("app.core.logging_config.logger") as mock_logger:
-            response = client.get("/api/v1/test-errors/middleware-chain", headers=headers)
-
-            assert response.status_code == 200
-            data = response.json()
-
-            # Get request ID from response
-            request_id = data["request_id"]
-
-            # Verify logging occurred
-            mock_logger.info.assert_called()
-
-            # All logs for this request should have the same request ID
-            # (This depends on implementation details)
+        # Should log JWT parsing warning
+        mock_logger.warning.assert_called()
 
 
 class TestLogFileHandling:
     """Test log file handling and rotation."""
 
-    def test_log_file_creation(self, temp_log_file):
-        """Test log file creation."""
-        with patch("app.core.logging_config.settings") as mock_settings:
-            mock_settings.LOG_FILE_PATH = temp_log_file
-            mock_settings.LOG_FORMAT = "json"
-            mock_settings.LOG_LEVEL = "INFO"
-
-            setup_logging()
-            logger = get_logger("test_file")
-            logger.info("Test log message")
+    @pytest.mark.parametrize("configured_logger", ["test.log", "subdir/test.log"], indirect=True)
+    def test_log_file_creation(self, configured_logger):
+        """Test log file and parent directory creation."""
+        log_path = configured_logger
+        logger = get_logger("test_file")
+        logger.info("Test log message")
 
-            # Verify log file exists and has content
-            log_path = Path(temp_log_file)
-            assert log_path.exists()
-
-            content = log_path.read_text()
-            assert len(content.strip()) > 0
-
-    def test_log_directory_creation(self):
-        """Test log directory creation."""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            log_file = Path(temp_dir) / "subdir" / "test.log"
-
-            with patch("app.core.logging_config.settings") as mock_settings:
-                mock_settings.LOG_FILE_PATH = str(log_file)
-                mock_settings.LOG_FORMAT = "json"
-                mock_settings.LOG_LEVEL = "INFO"
-
-                setup_logging()
-                logger = get_logger("test_dir")
-                logger.info("Test log message")
-
-                # Verify directory and file were created
-                assert log_file.parent.exists()
-                assert log_file.exists()
+        # Verify directory and file were created and the message landed in it
+        assert log_path.parent.exists()
+        assert log_path.exists()
+        assert "Test log message" in log_path.read_text()
 
 
 class TestErrorResponseSecurity:
     """Test error response security (no sensitive data leakage)."""
 
-    def test_error_response_no_sensitive_data(self, client):
+    def test_error_response_no_sensitive_data(self, error_client):
         """Test error responses don't leak sensitive data."""
-        response = client.get("/api/v1/test-errors/unexpected-error")
+        response = error_client.get("/api/v1/test-errors/unexpected-error")
 
         assert response.status_code == 500
-        data = response.json()
 
         # Should not contain sensitive information
-        response_str = json.dumps(data)
+        response_str = response.text
 
         # Should not contain file paths, stack traces, or internal details
-        sensitive_patterns = [
-            "/app/",
-            "Traceback",
-            'File "',
-            "line ",
-            "ZeroDivisionError",  # Internal exception details
-        ]
+        match = SENSITIVE_RE.search(response_str)
+        assert match is None, f"Sensitive data found: {match.group(0)}"
 
-        for pattern in sensitive_patterns:
-            assert pattern not in response_str, f"Sensitive data found: {pattern}"
-
-    def test_error_response_sanitization(self, client):
+    def test_error_response_sanitization(self, error_client):
         """Test error response sanitization."""
-        response = client.get("/api/v1/test-errors/database-error")
+        response = error_client.get("/api/v1/test-errors/database-error")
 
         assert response.status_code == 500
         data = response.json()
@@ -495,13 +383,5 @@ class TestErrorResponseSecurity:
         assert "message" in data
 
         # Should not contain database connection strings or internal details
-        response_str = json.dumps(data)
-        sensitive_db_patterns = [
-            "postgresql://",
-            "password",
-            "connection string",
-            "database host",
-        ]
-
-        for pattern in sensitive_db_patterns:
-            assert pattern.lower() not in response_str.lower()
+        match = SENSITIVE_DB_RE.search(response.text)
+        assert match is None, f"Sensitive data found: {match.group(0)}"
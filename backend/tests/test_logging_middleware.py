@@ -2,11 +2,12 @@
 Tests for logging middleware.
 """
 
-from unittest.mock import AsyncMock, Mock, patch
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
 
+import httpx
 import pytest
-from fastapi import FastAPI, Request, Response
-from fastapi.testclient import TestClient
+from fastapi import FastAPI
 
 from app.middleware.logging_middleware import (
     LoggingMiddleware,
@@ -29,56 +30,132 @@ class TestLoggingMiddleware:
             log_response_body=False,
         )
 
-    @pytest.mark.asyncio
-    async def test_middleware_skips_configured_paths(self):
+    @pytest.mark.asyncio(loop_scope="class")
+    @pytest.mark.parametrize("http_scope", [{"path": "/health"}], indirect=True)
+    async def test_middleware_skips_configured_paths(self, http_scope):
         """Test that middleware skips configured paths"""
-        request = Mock(spec=Request)
-        request.url.path = "/health"
-
-        call_next = AsyncMock()
-        mock_response = Mock(spec=Response)
-        call_next.return_value = mock_response
-
-        with patch("app.middleware.logging_middleware.log_request") as mock_log_request:
-            result = await self.middleware.dispatch(request, call_next)
-
-            assert result == mock_response
-            call_next.assert_called_once_with(request)
+        scope = http_scope
+        receive = AsyncMock()
+        send = AsyncMock()
+        inner_app = AsyncMock()
+        middleware = LoggingMiddleware(inner_app, skip_paths=["/health"])
+
+        with (
+            patch("app.middleware.logging_middleware.log_request") as mock_log_request,
+            patch("app.middleware.logging_middleware.log_response") as mock_log_response,
+        ):
+            await middleware(scope, receive, send)
+
+            inner_app.assert_awaited_once_with(scope, receive, send)
             mock_log_request.assert_not_called()
-
-    @pytest.mark.asyncio
+            mock_log_response.assert_not_called()
+
+    @pytest.mark.asyncio(loop_scope="class")
+    @pytest.mark.parametrize(
+        ("http_scope", "skipped"),
+        [
+            ({"path": "/health"}, True),
+            ({"path": "/static/app.js"}, True),
+            ({"path": "/static"}, False),
+            ({"path": "/api/test"}, False),
+        ],
+        indirect=["http_scope"],
+    )
+    async def test_skip_paths_exact_and_prefix(self, http_scope, skipped):
+        """Test exact and prefix skip path matching"""
+        middleware = LoggingMiddleware(AsyncMock(), skip_paths=["/health", "/static/*"])
+
+        with patch("app.middleware.logging_middleware.log_response") as mock_log_response:
+            await middleware(http_scope, AsyncMock(), AsyncMock())
+
+        assert mock_log_response.called is not skipped
+
+    @pytest.mark.asyncio(loop_scope="class")
     @patch("app.middleware.logging_middleware.log_request")
     @patch("app.middleware.logging_middleware.log_response")
-    @patch("app.middleware.logging_middleware.time.time")
-    @patch("uuid.uuid4")
-    async def test_middleware_logs_successful_request(self, mock_uuid, mock_time, mock_log_response, mock_log_request):
+    @patch("app.middleware.logging_middleware.time.perf_counter_ns")
+    @patch("app.middleware.logging_middleware.secrets.token_hex")
+    async def test_middleware_logs_successful_request(
+        self, mock_token_hex, mock_time, mock_log_response, mock_log_request, http_scope
+    ):
         """Test middleware logs successful request"""
         # Setup mocks
-        mock_uuid.return_value = "test-request-id"
-        mock_time.side_effect = [1000.0, 1000.123, 1000.123]  # start and end times (extra for error case)
-
-        request = Mock(spec=Request)
-        request.url.path = "/api/test"
-        request.method = "GET"
-        request.query_params = {}
-        request.headers = {"user-agent": "TestAgent/1.0"}
-        request.client.host = "192.168.1.1"
-        request.state = Mock()
-        request.state.user_id = None
-
-        call_next = AsyncMock()
-        mock_response = Mock(spec=Response)
-        mock_response.status_code = 200
-        mock_response.headers = {"content-length": "1024"}
-        call_next.return_value = mock_response
+        mock_token_hex.return_value = "test-request-id"
+        mock_time.side_effect = [1_000_000_000_000, 1_000_123_000_000]  # start and end times (ns)
+
+        scope = http_scope
+        sent = []
+
+        async def inner_app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-length", b"1024")]})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def send(message):
+            sent.append(message)
+
+        middleware = LoggingMiddleware(inner_app, skip_paths=["/health"])
 
         # Execute
-        result = await self.middleware.dispatch(request, call_next)
+        await middleware(scope, AsyncMock(), send)
 
         # Verify
-        assert result == mock_response
-        assert request.state.request_id == "test-request-id"
-        assert mock_response.headers["X-Request-ID"] == "test-request-id"
+        assert scope["state"]["request_id"] == "test-request-id"
+        assert (b"x-request-id", b"test-request-id") in sent[0]["headers"]
+
+        # Request start is not logged separately by default
+        mock_log_request.assert_not_called()
+
+        # Verify a single response record carries the request fields
+        mock_log_response.assert_called_once_with(
+            request_id="test-request-id",
+            status_code=200,
+            duration_ms=123.0,
+            response_size=1024,
+            request_context={
+                "request_id": "test-request-id",
+                "method": "GET",
+                "path": "/api/test",
+                "client_ip": "192.168.1.1",
+                "user_agent": "TestAgent/1.0",
+            },
+        )
+
+    @pytest.mark.asyncio(loop_scope="class")
+    @patch("app.middleware.logging_middleware.log_response")
+    @patch("app.middleware.logging_middleware.secrets.token_hex")
+    @pytest.mark.parametrize("http_scope", [{"state": {"request_id": "outer-request-id"}}], indirect=True)
+    async def test_middleware_reuses_existing_request_id(self, mock_token_hex, mock_log_response, http_scope):
+        """Test middleware keeps a request ID assigned by an outer middleware"""
+        sent = []
+
+        async def inner_app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def send(message):
+            sent.append(message)
+
+        middleware = LoggingMiddleware(inner_app)
+
+        await middleware(http_scope, AsyncMock(), send)
+
+        mock_token_hex.assert_not_called()
+        assert http_scope["state"]["request_id"] == "outer-request-id"
+        assert (b"x-request-id", b"outer-request-id") in sent[0]["headers"]
+        assert mock_log_response.call_args.kwargs["request_id"] == "outer-request-id"
+
+    @pytest.mark.asyncio(loop_scope="class")
+    @patch("app.middleware.logging_middleware.log_request")
+    @patch("app.middleware.logging_middleware.log_response")
+    @patch("app.middleware.logging_middleware.secrets.token_hex")
+    async def test_middleware_logs_request_start_when_enabled(
+        self, mock_token_hex, mock_log_response, mock_log_request, http_scope
+    ):
+        """Test middleware logs request start when log_request_start is set"""
+        mock_token_hex.return_value = "test-request-id"
+        middleware = LoggingMiddleware(AsyncMock(), log_request_start=True)
+
+        await middleware(http_scope, AsyncMock(), AsyncMock())
 
         mock_log_request.assert_called_once_with(
             method="GET",
@@ -89,44 +166,29 @@ class TestLoggingMiddleware:
             user_agent="TestAgent/1.0",
             query_params=None,
         )
-
-        # Verify response logging (allow for floating point precision differences)
         mock_log_response.assert_called_once()
-        call_args = mock_log_response.call_args
-        assert call_args[1]["request_id"] == "test-request-id"
-        assert call_args[1]["status_code"] == 200
-        assert abs(call_args[1]["duration_ms"] - 123.0) < 1.0
-        assert call_args[1]["response_size"] == 1024
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="class")
+    @pytest.mark.parametrize("http_scope", [{"method": "POST", "path": "/api/error"}], indirect=True)
     @patch("app.middleware.logging_middleware.log_request")
     @patch("app.middleware.logging_middleware.log_error")
-    @patch("app.middleware.logging_middleware.time.time")
-    @patch("uuid.uuid4")
-    async def test_middleware_logs_error(self, mock_uuid, mock_time, mock_log_error, mock_log_request):
+    @patch("app.middleware.logging_middleware.time.perf_counter_ns")
+    @patch("app.middleware.logging_middleware.secrets.token_hex")
+    async def test_middleware_logs_error(self, mock_token_hex, mock_time, mock_log_error, mock_log_request, http_scope):
         """Test middleware logs errors"""
         # Setup mocks
-        mock_uuid.return_value = "test-request-id"
-        mock_time.side_effect = [1000.0, 1000.456]  # start and end times
-
-        request = Mock(spec=Request)
-        request.url.path = "/api/error"
-        request.method = "POST"
-        request.query_params = {}
-        request.headers = {}
-        request.client.host = "192.168.1.1"
-        request.state = Mock()
-        request.state.user_id = None
-
-        call_next = AsyncMock()
-        test_exception = ValueError("Test error")
-        call_next.side_effect = test_exception
+        mock_token_hex.return_value = "test-request-id"
+        mock_time.side_effect = [1_000_000_000_000, 1_000_456_000_000]  # start and end times (ns)
+
+        scope = http_scope
+        inner_app = AsyncMock(side_effect=ValueError("Test error"))
+        middleware = LoggingMiddleware(inner_app, skip_paths=["/health"])
 
         # Execute and expect exception
         with pytest.raises(ValueError):
-            await self.middleware.dispatch(request, call_next)
+            await middleware(scope, AsyncMock(), AsyncMock())
 
-        # Verify error logging (allow for floating point precision differences)
+        # Verify error logging
         mock_log_error.assert_called_once()
         call_args = mock_log_error.call_args
         assert call_args[1]["request_id"] == "test-request-id"
@@ -134,55 +196,67 @@ class TestLoggingMiddleware:
         assert call_args[1]["error_message"] == "Test error"
         assert call_args[1]["additional_context"]["method"] == "POST"
         assert call_args[1]["additional_context"]["path"] == "/api/error"
-        assert abs(call_args[1]["additional_context"]["duration_ms"] - 456.0) < 1.0
+        assert call_args[1]["additional_context"]["client_ip"] == "192.168.1.1"
+        assert call_args[1]["additional_context"]["duration_ms"] == 456.0
 
-    def test_get_client_ip_from_x_forwarded_for(self):
+    @pytest.mark.parametrize("http_scope", [{"headers": [(b"x-forwarded-for", b"203.0.113.1, 192.168.1.1")]}], indirect=True)
+    def test_get_client_ip_from_x_forwarded_for(self, http_scope):
         """Test _get_client_ip with X-Forwarded-For header"""
-        request = Mock(spec=Request)
-        request.headers = {"x-forwarded-for": "203.0.113.1, 192.168.1.1"}
-
-        result = self.middleware._get_client_ip(request)
+        result = self.middleware._get_client_ip(http_scope)
 
         assert result == "203.0.113.1"
 
-    def test_get_client_ip_from_x_real_ip(self):
+    @pytest.mark.parametrize("http_scope", [{"headers": [(b"x-real-ip", b"203.0.113.2")]}], indirect=True)
+    def test_get_client_ip_from_x_real_ip(self, http_scope):
         """Test _get_client_ip with X-Real-IP header"""
-        request = Mock(spec=Request)
-        request.headers = {"x-real-ip": "203.0.113.2"}
-
-        result = self.middleware._get_client_ip(request)
+        result = self.middleware._get_client_ip(http_scope)
 
         assert result == "203.0.113.2"
 
-    def test_get_client_ip_from_client_host(self):
-        """Test _get_client_ip from client host"""
-        request = Mock(spec=Request)
-        request.headers = {}
-        request.client.host = "192.168.1.100"
+    @pytest.mark.parametrize(
+        "http_scope",
+        [{"headers": [(b"x-real-ip", b"203.0.113.2"), (b"x-forwarded-for", b"203.0.113.1")]}],
+        indirect=True,
+    )
+    def test_get_client_ip_prefers_x_forwarded_for(self, http_scope):
+        """Test _get_client_ip prefers X-Forwarded-For regardless of header order"""
+        result = self.middleware._get_client_ip(http_scope)
+
+        assert result == "203.0.113.1"
 
-        result = self.middleware._get_client_ip(request)
+    @pytest.mark.parametrize("http_scope", [{"client": ("192.168.1.100", 12345)}], indirect=True)
+    def test_get_client_ip_from_client_host(self, http_scope):
+        """Test _get_client_ip from client host"""
+        result = self.middleware._get_client_ip(http_scope)
 
         assert result == "192.168.1.100"
 
-    def test_get_client_ip_unknown(self):
+    @pytest.mark.parametrize("http_scope", [{"client": None}], indirect=True)
+    def test_get_client_ip_unknown(self, http_scope):
         """Test _get_client_ip when no client info available"""
-        request = Mock(spec=Request)
-        request.headers = {}
-        request.client = None
-
-        result = self.middleware._get_client_ip(request)
+        result = self.middleware._get_client_ip(http_scope)
 
         assert result == "unknown"
 
-    @pytest.mark.asyncio
-    async def test_log_request_body_json(self):
+    @pytest.mark.parametrize(
+        ("http_scope", "expected"),
+        [
+            ({"headers": [(b"content-type", b"application/json")]}, "application/json"),
+            ({"headers": [(b"content-type", b"text/plain; charset=utf-8")]}, "text/plain; charset=utf-8"),
+            ({"headers": [(b"content-type", b"image/png")]}, None),
+            ({"headers": []}, None),
+            ({"headers": [(b"content-type", b"application/json"), (b"content-length", b"20000")]}, None),
+        ],
+        indirect=["http_scope"],
+    )
+    def test_get_loggable_content_type(self, http_scope, expected):
+        """Test body logging is decided from content type and declared length alone"""
+        assert self.middleware._get_loggable_content_type(http_scope) == expected
+
+    def test_log_request_body_json(self):
         """Test _log_request_body with JSON content"""
-        request = Mock(spec=Request)
-        request.body = AsyncMock(return_value=b'{"key": "value"}')
-        request.headers = {"content-type": "application/json"}
-
         with patch("app.middleware.logging_middleware.logger") as mock_logger:
-            await self.middleware._log_request_body(request, "req_123")
+            self.middleware._log_request_body(b'{"key": "value"}', "req_123", "application/json")
 
             mock_logger.debug.assert_called_once_with(
                 "Request body",
@@ -193,55 +267,78 @@ class TestLoggingMiddleware:
                 },
             )
 
-    @pytest.mark.asyncio
-    async def test_log_request_body_binary(self):
-        """Test _log_request_body with binary content"""
-        request = Mock(spec=Request)
-        request.body = AsyncMock(return_value=b"\x89PNG\r\n\x1a\n")
-        request.headers = {"content-type": "image/png"}
-
-        with patch("app.middleware.logging_middleware.logger") as mock_logger:
-            await self.middleware._log_request_body(request, "req_123")
-
-            # Binary content types are not logged, so no debug call should be made
-            mock_logger.debug.assert_not_called()
-
-    @pytest.mark.asyncio
-    async def test_log_request_body_too_large(self):
+    def test_log_request_body_too_large(self):
         """Test _log_request_body with large content"""
-        request = Mock(spec=Request)
         large_body = b"x" * 20000  # 20KB
-        request.body = AsyncMock(return_value=large_body)
-        request.headers = {"content-type": "application/json"}
 
         with patch("app.middleware.logging_middleware.logger") as mock_logger:
-            await self.middleware._log_request_body(request, "req_123")
+            self.middleware._log_request_body(large_body, "req_123", "application/json")
 
             # Should not log large bodies
             mock_logger.debug.assert_not_called()
 
+    @pytest.mark.asyncio(loop_scope="class")
+    @pytest.mark.parametrize(
+        "http_scope",
+        [{"method": "POST", "headers": [(b"content-type", b"application/json")]}],
+        indirect=True,
+    )
+    async def test_capture_request_body(self, http_scope):
+        """Test the receive wrapper passes chunks through and logs the whole body once"""
+        messages = [
+            {"type": "http.request", "body": b'{"key": ', "more_body": True},
+            {"type": "http.request", "body": b'"value"}', "more_body": False},
+        ]
+        receive = AsyncMock(side_effect=messages)
+
+        with patch.object(self.middleware, "_log_request_body") as mock_log_body:
+            receive_wrapper = self.middleware._capture_request_body(http_scope, "req_123", receive)
+
+            assert await receive_wrapper() == messages[0]
+            mock_log_body.assert_not_called()
+            assert await receive_wrapper() == messages[1]
+
+        mock_log_body.assert_called_once_with(bytearray(b'{"key": "value"}'), "req_123", "application/json")
+
+    @pytest.mark.asyncio(loop_scope="class")
+    @pytest.mark.parametrize(
+        "http_scope",
+        [{"method": "POST", "headers": [(b"content-type", b"image/png")]}],
+        indirect=True,
+    )
+    async def test_middleware_skips_binary_body(self, http_scope):
+        """Test middleware never reads a body whose content type is not logged"""
+        middleware = LoggingMiddleware(AsyncMock(), log_request_body=True)
+
+        with (
+            patch("app.middleware.logging_middleware.log_response"),
+            patch.object(middleware, "_log_request_body") as mock_log_body,
+        ):
+            await middleware(http_scope, AsyncMock(), AsyncMock())
+
+        mock_log_body.assert_not_called()
+
 
 class TestUtilityFunctions:
     """Test utility functions"""
 
-    def test_get_request_id_from_state(self):
+    @patch("app.middleware.logging_middleware.secrets.token_hex")
+    def test_get_request_id_from_state(self, mock_token_hex):
         """Test get_request_id when request has ID in state"""
-        request = Mock(spec=Request)
-        request.state.request_id = "existing-id"
+        request = SimpleNamespace(state=SimpleNamespace(request_id="existing-id"))
 
         result = get_request_id(request)
 
         assert result == "existing-id"
+        # No throwaway ID is generated when one already exists
+        mock_token_hex.assert_not_called()
 
-    @patch("uuid.uuid4")
-    def test_get_request_id_generate_new(self, mock_uuid):
+    @patch("app.middleware.logging_middleware.secrets.token_hex")
+    def test_get_request_id_generate_new(self, mock_token_hex):
         """Test get_request_id generates new ID when not in state"""
-        mock_uuid.return_value = "new-generated-id"
+        mock_token_hex.return_value = "new-generated-id"
 
-        request = Mock(spec=Request)
-        request.state = Mock()
-        # Simulate missing request_id attribute
-        del request.state.request_id
+        request = SimpleNamespace(state=SimpleNamespace())
 
         result = get_request_id(request)
 
@@ -249,10 +346,7 @@ class TestUtilityFunctions:
 
     def test_add_log_context_new(self):
         """Test add_log_context creates new context"""
-        request = Mock(spec=Request)
-        request.state = Mock()
-        # Simulate missing log_context attribute initially
-        del request.state.log_context
+        request = SimpleNamespace(state=SimpleNamespace())
 
         add_log_context(request, key1="value1", key2="value2")
 
@@ -260,8 +354,7 @@ class TestUtilityFunctions:
 
     def test_add_log_context_existing(self):
         """Test add_log_context updates existing context"""
-        request = Mock(spec=Request)
-        request.state.log_context = {"existing": "value"}
+        request = SimpleNamespace(state=SimpleNamespace(log_context={"existing": "value"}))
 
         add_log_context(request, key1="value1", key2="value2")
 
@@ -270,8 +363,7 @@ class TestUtilityFunctions:
 
     def test_get_log_context_existing(self):
         """Test get_log_context returns existing context"""
-        request = Mock(spec=Request)
-        request.state.log_context = {"key": "value"}
+        request = SimpleNamespace(state=SimpleNamespace(log_context={"key": "value"}))
 
         result = get_log_context(request)
 
@@ -279,10 +371,7 @@ class TestUtilityFunctions:
 
     def test_get_log_context_missing(self):
         """Test get_log_context returns empty dict when no context"""
-        request = Mock(spec=Request)
-        request.state = Mock()
-        # Simulate missing log_context attribute
-        del request.state.log_context
+        request = SimpleNamespace(state=SimpleNamespace())
 
         result = get_log_context(request)
 
@@ -292,7 +381,8 @@ class TestUtilityFunctions:
 class TestLoggingMiddlewareIntegration:
     """Integration tests for LoggingMiddleware"""
 
-    def test_middleware_integration(self):
+    @pytest.mark.asyncio(loop_scope="class")
+    async def test_middleware_integration(self):
         """Test middleware integration with FastAPI"""
         app = FastAPI()
         app.add_middleware(LoggingMiddleware, skip_paths=["/health"])
@@ -305,24 +395,27 @@ class TestLoggingMiddlewareIntegration:
         async def health_endpoint():
             return {"status": "ok"}
 
-        client = TestClient(app)
+        transport = httpx.ASGITransport(app=app)
 
-        with patch("app.middleware.logging_middleware.log_request") as mock_log_request:
-            with patch("app.middleware.logging_middleware.log_response") as mock_log_response:
+        with (
+            patch("app.middleware.logging_middleware.log_request") as mock_log_request,
+            patch("app.middleware.logging_middleware.log_response") as mock_log_response,
+        ):
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
                 # Test normal endpoint (should be logged)
-                response = client.get("/test")
+                response = await client.get("/test")
                 assert response.status_code == 200
                 assert "X-Request-ID" in response.headers
 
-                mock_log_request.assert_called()
-                mock_log_response.assert_called()
+                mock_log_request.assert_not_called()
+                mock_log_response.assert_called_once()
 
                 # Reset mocks
                 mock_log_request.reset_mock()
                 mock_log_response.reset_mock()
 
                 # Test health endpoint (should be skipped)
-                response = client.get("/health")
+                response = await client.get("/health")
                 assert response.status_code == 200
 
                 mock_log_request.assert_not_called()
@@ -3,9 +3,12 @@ Tests for logging models and formatters.
 """
 
 import json
-from datetime import datetime
+from datetime import UTC, datetime
 from unittest.mock import Mock
 
+import pytest
+
+from app.core import logging_models
 from app.core.logging_models import (
     ErrorLogEntry,
     LogEntry,
@@ -59,6 +62,14 @@ class TestLogEntry:
         assert entry.duration_ms is None
         assert entry.extra is None
 
+    def test_log_entry_json_timestamp(self):
+        """Test log entry serializes timestamp as ISO 8601"""
+        entry = LogEntry(timestamp=datetime(2024, 1, 1, 12, 0, 0, tzinfo=UTC), level="INFO", message="Test")
+
+        data = json.loads(entry.model_dump_json())
+
+        assert data["timestamp"] == "2024-01-01T12:00:00Z"
+
 
 class TestRequestLogEntry:
     """Test RequestLogEntry model"""
@@ -125,14 +136,11 @@ class TestFormatLogRecord:
 
     def test_format_basic_record(self):
         """Test formatting basic log record"""
-        mock_time = Mock()
-        mock_time.isoformat.return_value = "2024-01-01T12:00:00Z"
-
         mock_level = Mock()
         mock_level.name = "INFO"
 
         record = {
-            "time": mock_time,
+            "time": datetime(2024, 1, 1, 12, 0, 0, tzinfo=UTC),
             "level": mock_level,
             "message": "Test message",
             "name": "test_module",
@@ -143,7 +151,7 @@ class TestFormatLogRecord:
         result = format_log_record(record)
         data = json.loads(result)
 
-        assert data["timestamp"] == "2024-01-01T12:00:00Z"
+        assert data["timestamp"] == "2024-01-01T12:00:00+00:00"
         assert data["level"] == "INFO"
         assert data["message"] == "Test message"
         assert data["module"] == "test_module"
@@ -152,14 +160,11 @@ class TestFormatLogRecord:
 
     def test_format_record_with_extra(self):
         """Test formatting record with extra fields"""
-        mock_time = Mock()
-        mock_time.isoformat.return_value = "2024-01-01T12:00:00Z"
-
         mock_level = Mock()
         mock_level.name = "INFO"
 
         record = {
-            "time": mock_time,
+            "time": datetime(2024, 1, 1, 12, 0, 0, tzinfo=UTC),
             "level": mock_level,
             "message": "Test message",
             "name": "test_module",
@@ -177,11 +182,55 @@ class TestFormatLogRecord:
         assert data["request_id"] == "req_123"
         assert data["user_id"] == "user_456"
 
+    def test_format_record_with_non_string_keys(self):
+        """Test formatting record whose extra data has non-string keys"""
+        mock_level = Mock()
+        mock_level.name = "INFO"
+
+        record = {
+            "time": datetime(2024, 1, 1, 12, 0, 0, tzinfo=UTC),
+            "level": mock_level,
+            "message": "Test message",
+            "name": "test_module",
+            "function": "test_function",
+            "line": 42,
+            "extra": {"status_counts": {200: 3, 404: 1}},
+        }
+
+        result = format_log_record(record)
+        data = json.loads(result)
+
+        assert data["status_counts"] == {"200": 3, "404": 1}
+
+    @pytest.mark.parametrize("use_orjson", [True, False])
+    def test_format_record_with_naive_datetime(self, monkeypatch, use_orjson):
+        """Test naive datetimes are written as UTC with or without orjson"""
+        if use_orjson:
+            pytest.importorskip("orjson")
+        else:
+            monkeypatch.setattr(logging_models, "orjson", None)
+
+        mock_level = Mock()
+        mock_level.name = "INFO"
+
+        record = {
+            "time": datetime(2024, 1, 1, 12, 0, 0),
+            "level": mock_level,
+            "message": "Test message",
+            "name": "test_module",
+            "function": "test_function",
+            "line": 42,
+            "extra": {"started_at": datetime(2024, 1, 1, 11, 59, 30, 500000)},
+        }
+
+        result = format_log_record(record)
+        data = json.loads(result)
+
+        assert data["timestamp"] == "2024-01-01T12:00:00+00:00"
+        assert data["started_at"] == "2024-01-01T11:59:30.500000+00:00"
+
     def test_format_record_with_exception(self):
         """Test formatting record with exception"""
-        mock_time = Mock()
-        mock_time.isoformat.return_value = "2024-01-01T12:00:00Z"
-
         mock_exception_type = Mock()
         mock_exception_type.__name__ = "ValueError"
 
@@ -189,7 +238,7 @@ class TestFormatLogRecord:
         mock_level.name = "ERROR"
 
         record = {
-            "time": mock_time,
+            "time": datetime(2024, 1, 1, 12, 0, 0, tzinfo=UTC),
             "level": mock_level,
             "message": "Error occurred",
             "name": "test_module",
@@ -254,6 +303,23 @@ class TestContextCreators:
 
         assert context == expected
 
+    def test_create_request_context_drops_empty_values(self):
+        """Test create_request_context omits empty query params and headers"""
+        context = create_request_context(
+            request_id="req_123",
+            method="GET",
+            path="/api/test",
+            client_ip="",
+            user_agent="",
+            query_params={},
+        )
+
+        assert context == {
+            "request_id": "req_123",
+            "method": "GET",
+            "path": "/api/test",
+        }
+
     def test_create_response_context(self):
         """Test create_response_context function"""
         context = create_response_context(
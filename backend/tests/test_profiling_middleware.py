@@ -0,0 +1,77 @@
+"""
+Tests for profiling middleware.
+"""
+
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.middleware import profiling
+from app.middleware.profiling import ProfilingMiddleware
+
+
+@pytest.fixture
+def profiler_available():
+    """Pretend pyinstrument is installed so the middleware can be built."""
+    with patch.object(profiling, "Profiler", profiling.Profiler or object):
+        yield
+
+
+class TestProfilingMiddleware:
+    """Test ProfilingMiddleware class"""
+
+    def test_requires_pyinstrument(self):
+        """Test that the middleware refuses to start without pyinstrument"""
+        with patch.object(profiling, "Profiler", None), pytest.raises(RuntimeError):
+            ProfilingMiddleware(AsyncMock())
+
+    @pytest.mark.parametrize(
+        ("query_string", "expected"),
+        [
+            (b"", False),
+            (b"profile=0", False),
+            (b"page=2", False),
+            (b"profile=1", True),
+            (b"page=2&profile=true", True),
+        ],
+    )
+    def test_profiling_requested(self, profiler_available, http_scope, query_string, expected):
+        """Test detection of the profile query parameter"""
+        middleware = ProfilingMiddleware(AsyncMock())
+        http_scope["query_string"] = query_string
+
+        assert middleware._profiling_requested(http_scope) is expected
+
+    @pytest.mark.asyncio
+    async def test_unprofiled_request_passes_through(self, profiler_available, http_scope):
+        """Test that requests without the parameter reach the app untouched"""
+        inner_app = AsyncMock()
+        middleware = ProfilingMiddleware(inner_app)
+        receive = AsyncMock()
+        send = AsyncMock()
+
+        await middleware(http_scope, receive, send)
+
+        inner_app.assert_awaited_once_with(http_scope, receive, send)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("http_scope", [{"query_string": b"profile=1"}], indirect=True)
+    async def test_profiled_request_returns_report(self, http_scope):
+        """Test that a profiled request is answered with the HTML report"""
+        pytest.importorskip("pyinstrument")
+
+        async def inner_app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"original"})
+
+        middleware = ProfilingMiddleware(inner_app)
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await middleware(http_scope, AsyncMock(), send)
+
+        assert sent[0]["status"] == 200
+        assert (b"content-type", b"text/html; charset=utf-8") in sent[0]["headers"]
+        assert b"original" not in sent[1]["body"]
@@ -2,7 +2,10 @@
 Tests for user schema models.
 """
 
-from app.schemas.user import JWTParseResult, UserContext
+import pytest
+from pydantic import ValidationError
+
+from app.schemas.user import ANONYMOUS_CONTEXT, JWTParseResult, UserContext
 
 
 class TestUserContext:
@@ -62,98 +65,70 @@ class TestUserContext:
         context = UserContext(user_id="")
         assert context.is_authenticated() is False
 
-    def test_has_role_existing(self):
-        """Test has_role returns True for existing role."""
-        context = UserContext(roles=["admin", "user", "moderator"])
-        assert context.has_role("admin") is True
-        assert context.has_role("user") is True
-        assert context.has_role("moderator") is True
-
-    def test_has_role_non_existing(self):
-        """Test has_role returns False for non-existing role."""
-        context = UserContext(roles=["user"])
-        assert context.has_role("admin") is False
-        assert context.has_role("moderator") is False
-
-    def test_has_role_empty_roles(self):
-        """Test has_role returns False when roles list is empty."""
-        context = UserContext(roles=[])
-        assert context.has_role("admin") is False
-
-    def test_has_role_case_sensitive(self):
-        """Test has_role is case sensitive."""
-        context = UserContext(roles=["Admin"])
-        assert context.has_role("admin") is False
-        assert context.has_role("Admin") is True
-
-    def test_has_permission_existing(self):
-        """Test has_permission returns True for existing permission."""
-        context = UserContext(permissions=["read", "write", "delete"])
-        assert context.has_permission("read") is True
-        assert context.has_permission("write") is True
-        assert context.has_permission("delete") is True
-
-    def test_has_permission_non_existing(self):
-        """Test has_permission returns False for non-existing permission."""
-        context = UserContext(permissions=["read"])
-        assert context.has_permission("write") is False
-        assert context.has_permission("delete") is False
-
-    def test_has_permission_empty_permissions(self):
-        """Test has_permission returns False when permissions list is empty."""
-        context = UserContext(permissions=[])
-        assert context.has_permission("read") is False
-
-    def test_has_permission_case_sensitive(self):
-        """Test has_permission is case sensitive."""
-        context = UserContext(permissions=["Read"])
-        assert context.has_permission("read") is False
-        assert context.has_permission("Read") is True
-
-    def test_has_any_role_with_match(self):
-        """Test has_any_role returns True when user has at least one role."""
-        context = UserContext(roles=["user", "guest"])
-        assert context.has_any_role(["admin", "user"]) is True
-        assert context.has_any_role(["guest", "moderator"]) is True
-
-    def test_has_any_role_without_match(self):
-        """Test has_any_role returns False when user has none of the roles."""
-        context = UserContext(roles=["guest"])
-        assert context.has_any_role(["admin", "user"]) is False
-        assert context.has_any_role(["moderator", "editor"]) is False
-
-    def test_has_any_role_empty_user_roles(self):
-        """Test has_any_role returns False when user has no roles."""
-        context = UserContext(roles=[])
-        assert context.has_any_role(["admin", "user"]) is False
-
-    def test_has_any_role_empty_required_roles(self):
-        """Test has_any_role returns False when required roles list is empty."""
-        context = UserContext(roles=["admin", "user"])
-        assert context.has_any_role([]) is False
-
-    def test_has_all_roles_with_all_roles(self):
-        """Test has_all_roles returns True when user has all required roles."""
-        context = UserContext(roles=["admin", "user", "moderator"])
-        assert context.has_all_roles(["admin", "user"]) is True
-        assert context.has_all_roles(["user"]) is True
-        assert context.has_all_roles(["admin", "user", "moderator"]) is True
-
-    def test_has_all_roles_without_all_roles(self):
-        """Test has_all_roles returns False when user doesn't have all required roles."""
-        context = UserContext(roles=["user"])
-        assert context.has_all_roles(["admin", "user"]) is False
-        assert context.has_all_roles(["admin", "moderator"]) is False
-
-    def test_has_all_roles_empty_user_roles(self):
-        """Test has_all_roles returns False when user has no roles."""
-        context = UserContext(roles=[])
-        assert context.has_all_roles(["admin"]) is False
-
-    def test_has_all_roles_empty_required_roles(self):
-        """Test has_all_roles returns True when required roles list is empty."""
-        context = UserContext(roles=["admin", "user"])
-        assert context.has_all_roles([]) is True
+    @pytest.mark.parametrize(
+        ("roles", "role", "expected"),
+        [
+            pytest.param(["admin", "user", "moderator"], "admin", True, id="existing-first"),
+            pytest.param(["admin", "user", "moderator"], "user", True, id="existing-middle"),
+            pytest.param(["admin", "user", "moderator"], "moderator", True, id="existing-last"),
+            pytest.param(["user"], "admin", False, id="non-existing"),
+            pytest.param(["user"], "moderator", False, id="non-existing-other"),
+            pytest.param([], "admin", False, id="empty-roles"),
+            pytest.param(["Admin"], "admin", False, id="case-sensitive-miss"),
+            pytest.param(["Admin"], "Admin", True, id="case-sensitive-hit"),
+        ],
+    )
+    def test_has_role(self, roles, role, expected):
+        """Test has_role matches roles exactly and case sensitively."""
+        assert UserContext(roles=roles).has_role(role) is expected
+
+    @pytest.mark.parametrize(
+        ("permissions", "permission", "expected"),
+        [
+            pytest.param(["read", "write", "delete"], "read", True, id="existing-first"),
+            pytest.param(["read", "write", "delete"], "write", True, id="existing-middle"),
+            pytest.param(["read", "write", "delete"], "delete", True, id="existing-last"),
+            pytest.param(["read"], "write", False, id="non-existing"),
+            pytest.param(["read"], "delete", False, id="non-existing-other"),
+            pytest.param([], "read", False, id="empty-permissions"),
+            pytest.param(["Read"], "read", False, id="case-sensitive-miss"),
+            pytest.param(["Read"], "Read", True, id="case-sensitive-hit"),
+        ],
+    )
+    def test_has_permission(self, permissions, permission, expected):
+        """Test has_permission matches permissions exactly and case sensitively."""
+        assert UserContext(permissions=permissions).has_permission(permission) is expected
+
+    @pytest.mark.parametrize(
+        ("roles", "required", "expected"),
+        [
+            pytest.param(["user", "guest"], ["admin", "user"], True, id="match"),
+            pytest.param(["user", "guest"], ["guest", "moderator"], True, id="match-other"),
+            pytest.param(["guest"], ["admin", "user"], False, id="no-match"),
+            pytest.param(["guest"], ["moderator", "editor"], False, id="no-match-other"),
+            pytest.param([], ["admin", "user"], False, id="empty-user-roles"),
+            pytest.param(["admin", "user"], [], False, id="empty-required-roles"),
+        ],
+    )
+    def test_has_any_role(self, roles, required, expected):
+        """Test has_any_role is True when at least one required role is held."""
+        assert UserContext(roles=roles).has_any_role(required) is expected
+
+    @pytest.mark.parametrize(
+        ("roles", "required", "expected"),
+        [
+            pytest.param(["admin", "user", "moderator"], ["admin", "user"], True, id="subset"),
+            pytest.param(["admin", "user", "moderator"], ["user"], True, id="single"),
+            pytest.param(["admin", "user", "moderator"], ["admin", "user", "moderator"], True, id="all"),
+            pytest.param(["user"], ["admin", "user"], False, id="partial"),
+            pytest.param(["user"], ["admin", "moderator"], False, id="none"),
+            pytest.param([], ["admin"], False, id="empty-user-roles"),
+            pytest.param(["admin", "user"], [], True, id="empty-required-roles"),
+        ],
+    )
+    def test_has_all_roles(self, roles, required, expected):
+        """Test has_all_roles is True only when every required role is held."""
+        assert UserContext(roles=roles).has_all_roles(required) is expected
 
     def test_user_context_serialization(self):
         """Test UserContext can be serialized to dict."""
@@ -276,6 +251,32 @@ class TestUserContextEdgeCases:
         assert context.roles == []  # Should default to empty list
         assert context.permissions == []  # Should default to empty list
 
+    def test_user_context_is_frozen(self):
+        """Test UserContext rejects attribute assignment since instances are shared."""
+        context = UserContext(user_id="user123")
+
+        with pytest.raises(ValidationError):
+            context.user_id = "other"
+
+    def test_anonymous_context(self):
+        """Test the shared anonymous context is unauthenticated and empty."""
+        assert UserContext() == ANONYMOUS_CONTEXT
+        assert ANONYMOUS_CONTEXT.is_authenticated() is False
+        assert ANONYMOUS_CONTEXT.has_any_role(["admin", "user"]) is False
+
+    def test_model_copy_rebuilds_role_and_permission_sets(self):
+        """Test role and permission checks follow fields replaced through model_copy."""
+        context = UserContext(roles=["admin"], permissions=["read"])
+        assert context.has_role("admin") is True
+
+        copied = context.model_copy(update={"roles": ["user"], "permissions": ["write"]})
+
+        assert copied.has_role("admin") is False
+        assert copied.has_all_roles(["user"]) is True
+        assert copied.has_permission("read") is False
+        assert copied.has_permission("write") is True
+        assert context.has_role("admin") is True
+
     def test_user_context_with_duplicate_roles(self):
         """Test UserContext with duplicate roles."""
         context = UserContext(roles=["admin", "user", "admin", "user"])